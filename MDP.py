@@ -1,6 +1,18 @@
-# General MDP 
+import json
+import os
+from functools import cached_property
+import numpy as np
+import scipy.sparse as sp
+from modelValidation import absorbingStates, orderedLabels, validateModel
+from transitionSampler import TransitionSampler
+
+# version of the on-disk layout written by MDP.save; bump when it changes incompatibly
+MODEL_FORMAT_VERSION = 1
+
+# General MDP
 class MDP:
-    def __init__(self, states, actions, transition_matrix, reward_matrix, discount_factor=1.0):
+    def __init__(self, states, actions, transition_matrix, reward_matrix, discount_factor=1.0, sparse=False,
+                 validate=True, normalize=False, tolerance=1e-6, terminal_states=None):
         """
         Initialize the MDP with given states, actions, transition probabilities, rewards, and discount factor.
 
@@ -10,7 +22,18 @@ class MDP:
         - transition_matrix: Matrix where each row represents the current state, each column represents an action,
                              and the inner lists represent the next state probabilities.
         - reward_matrix: Matrix where each row represents the current state and each column represents an action.
+                         A reward of -inf marks an action the state doesn't offer (see from_dictionary).
         - discount_factor: Discount factor for future rewards (gamma in Sutton & Barto)
+        - sparse: If True, store the transitions as a CSR matrix of shape (S*A, S), where row s*A + a holds
+                  the next state probabilities of taking action a in state s. A scipy.sparse matrix of that
+                  shape may also be passed directly as transition_matrix.
+        - validate: Check shapes, probabilities and row sums (see modelValidation); raises ValueError on failure
+        - normalize: Rescale transition rows that do not sum to 1 instead of raising
+        - tolerance: Allowed deviation of each transition row sum from 1
+        - terminal_states: States that end an episode (see terminal_mask). Defaults to the absorbing states,
+                           those whose every action leads back to themselves with probability 1
+
+        states and actions must be ordered (e.g. lists): row i of the matrices belongs to the i-th state.
         """
         self.states = states
         self.actions = actions
@@ -18,6 +41,350 @@ class MDP:
         self.reward_matrix = reward_matrix
         self.discount_factor = discount_factor
 
+        # label maps between integer indices (used by the array solvers) and state/action labels (used for display)
+        self.state_labels = orderedLabels(states, "states")
+        self.action_labels = orderedLabels(actions, "actions")
+        self.terminal_states = None if terminal_states is None else list(terminal_states)
+
+        # P[s, a, s'] (or its sparse (S*A, S) form) and R[s, a] as float64 arrays
+        if sp.issparse(transition_matrix) or sparse:
+            self.P = self._to_csr(transition_matrix)
+        else:
+            self.P = np.ascontiguousarray(transition_matrix, dtype=np.float64)
+        self.R = np.ascontiguousarray(reward_matrix, dtype=np.float64)
+
+        self.tolerance = tolerance
+        self.validation_report = None
+        if validate:
+            self.validate(tolerance, normalize)
+
+    def _to_csr(self, transition_matrix):
+        num_rows = self.num_states * self.num_actions
+        if sp.issparse(transition_matrix):
+            P = sp.csr_matrix(transition_matrix, dtype=np.float64)
+        else:
+            P = sp.csr_matrix(np.asarray(transition_matrix, dtype=np.float64).reshape(num_rows, self.num_states))
+        if P.shape != (num_rows, self.num_states):
+            raise ValueError(f"Sparse transition matrix must have shape {(num_rows, self.num_states)}, got {P.shape}")
+
+        # drop explicit zeros so backups only visit actual successors
+        P.eliminate_zeros()
+        P.sort_indices()
+        return P
+
+    def validate(self, tolerance=None, normalize=False):
+        """
+        Run the model checks (see modelValidation) and return the report, which also lists the absorbing
+        states. With normalize=True rows that do not sum to 1 are rescaled in P. tolerance defaults to the
+        model's own (set by __init__), and is kept for later checks such as update_rows.
+        """
+        if tolerance is None:
+            tolerance = self.tolerance
+        self.tolerance = tolerance
+        P, self.validation_report = validateModel(self.P, self.R, self.state_labels, self.action_labels, tolerance,
+                                                  normalize)
+        if P is not self.P:
+            self.P = P
+        return self.validation_report
+
+    # built on first use, so loading a saved model with many states does not pay for them up front
+    @cached_property
+    def state_index(self):
+        return {s: i for i, s in enumerate(self.state_labels)}
+
+    @cached_property
+    def action_index(self):
+        return {a: j for j, a in enumerate(self.action_labels)}
+
+    @property
+    def P(self):
+        return self._P
+
+    @P.setter
+    def P(self, transition_model):
+        # anything derived from the transitions is stale once they change
+        self._P = transition_model
+        self.invalidate_samplers()
+
+    def invalidate_samplers(self):
+        """
+        Drop cached transition samplers (and the detected absorbing states). Call after editing P in place;
+        assigning a new P does this automatically.
+        """
+        self._samplers = {}
+        self._absorbing_mask = None
+
+    def transition_sampler(self, method="alias"):
+        """
+        Sampler for next states of (state, action) pairs, built on first use and cached until P changes.
+        Row s * num_actions + a of the sampler corresponds to taking action a in state s (see transitionSampler).
+        """
+        if method not in self._samplers:
+            P = self.P if self.is_sparse else self.P.reshape(self.num_states * self.num_actions, self.num_states)
+            self._samplers[method] = TransitionSampler(P, method)
+        return self._samplers[method]
+
+    def sample_next_states(self, states, actions, rng=None):
+        """
+        Draw one next state index for each pair of state and action indices.
+        """
+        rows = np.asarray(states, dtype=np.intp) * self.num_actions + np.asarray(actions, dtype=np.intp)
+        return self.transition_sampler().sample_rows(rows, rng)
+
+    @property
+    def action_mask(self):
+        """
+        (S, A) boolean array, False for the actions a state doesn't offer, whose reward is -inf (see from_dictionary).
+        """
+        return ~np.isneginf(self.R)
+
+    @property
+    def terminal_mask(self):
+        """
+        Boolean array, True for the states that end an episode: the declared terminal_states if any were
+        given, otherwise the absorbing states detected from P (recomputed when P is replaced). Solvers pin
+        these states' values instead of backing them up, and simulators retire episodes that reach them.
+        """
+        if self.terminal_states is not None:
+            mask = np.zeros(self.num_states, dtype=bool)
+            mask[[self.state_index[s] for s in self.terminal_states]] = True
+            return mask
+        if self._absorbing_mask is None:
+            self._absorbing_mask = absorbingStates(self.P, self.num_states, self.num_actions)
+        return self._absorbing_mask
+
+    @property
+    def is_sparse(self):
+        return sp.issparse(self.P)
+
+    @property
+    def num_states(self):
+        return len(self.state_labels)
+
+    @property
+    def num_actions(self):
+        return len(self.action_labels)
+
+    @classmethod
+    def from_dictionary(cls, states, actions, transition_probs, rewards, discount_factor=1.0, sparse=False,
+                        terminal_states=None):
+        """
+        Build an MDP from the dictionary format returned by convert_to_dictionary.
+
+        Parameters:
+        - states: List of states
+        - actions: Dictionary of available actions for each state. States may offer different actions: the model's
+                   actions are all of them in order of first appearance, and an action a state doesn't offer
+                   becomes a self-loop with reward -inf, which no solver ever picks (see action_mask)
+        - transition_probs: Dictionary of transition probabilities, transition_probs[state][action][next_state]
+        - rewards: Dictionary of rewards for state-action pairs, rewards[state][action]
+        - discount_factor: Discount factor for future rewards
+        - sparse: If True, store the transitions in CSR form (see __init__)
+        - terminal_states: Optional list of states that end an episode (see terminal_mask)
+
+        Returns:
+        - MDP instance holding the equivalent P and R arrays
+        """
+        states = list(states)
+        # dict.fromkeys keeps the first appearance of every action, so uniform action sets keep their order
+        action_labels = list(dict.fromkeys(a for state in states for a in actions[state]))
+        offered = {state: set(actions[state]) for state in states}
+
+        def transitions(s, a):
+            if a in offered[s]:
+                return [transition_probs[s][a][s_prime] for s_prime in states]
+            return [1.0 if s_prime == s else 0.0 for s_prime in states]
+
+        transition_matrix = [[transitions(s, a) for a in action_labels] for s in states]
+        reward_matrix = [[rewards[s][a] if a in offered[s] else -np.inf for a in action_labels] for s in states]
+
+        return cls(states, action_labels, transition_matrix, reward_matrix, discount_factor, sparse,
+                   terminal_states=terminal_states)
+
+    def update_rows(self, transitions=None, rewards=None):
+        """
+        Replace the next state probabilities and/or rewards of some (state, action) pairs in place.
+
+        Parameters:
+        - transitions: {(state, action): {next_state: probability}}; next states left out get probability 0
+        - rewards: {(state, action): reward}
+
+        Edited rows must sum to 1 within the model's tolerance (see __init__ and validate).
+
+        Returns:
+        - Sorted list of the (state, action) pairs that were edited, to pass to valueIteration.updateValueIteration
+        """
+        transitions = transitions or {}
+        rewards = rewards or {}
+
+        if transitions:
+            row_ids, columns, values = [], [], []
+            for (s, a), next_states in transitions.items():
+                row = self.state_index[s] * self.num_actions + self.action_index[a]
+                for s_prime, probability in next_states.items():
+                    row_ids.append(row)
+                    columns.append(self.state_index[s_prime])
+                    values.append(probability)
+
+            num_rows = self.num_states * self.num_actions
+            edited = np.unique(np.array([self.state_index[s] * self.num_actions + self.action_index[a]
+                                         for s, a in transitions], dtype=np.intp))
+
+            # check the new rows before touching P, so a bad edit leaves the model as it was
+            values = np.asarray(values, dtype=np.float64)
+            row_sums = np.bincount(row_ids, weights=values, minlength=num_rows)[edited]
+            if np.any(values < 0) or np.any(np.abs(row_sums - 1) > self.tolerance):
+                raise ValueError("Edited transition rows must hold non-negative probabilities summing to 1")
+
+            if self.is_sparse:
+                # clear the edited rows, then add the new entries; both steps are O(nnz)
+                keep = np.ones(num_rows)
+                keep[edited] = 0
+                new_rows = sp.csr_matrix((values, (row_ids, columns)), shape=(num_rows, self.num_states))
+                self.P = self._to_csr(sp.diags(keep) @ self.P + new_rows)
+            else:
+                P_rows = self.P.reshape(num_rows, self.num_states)
+                P_rows[edited] = 0
+                np.add.at(P_rows, (row_ids, columns), values)
+                self.invalidate_samplers()
+
+        for (s, a), reward in rewards.items():
+            self.R[self.state_index[s], self.action_index[a]] = reward
+
+        changed = set(transitions) | set(rewards)
+        return sorted(changed, key=lambda pair: (self.state_index[pair[0]], self.action_index[pair[1]]))
+
+    def save(self, path, V=None, policy=None):
+        """
+        Save the model, and optionally a solved value array and policy (indexed like state_labels), to the
+        directory path. Labels must be strings, numbers or tuples of them.
+
+        The directory holds header.json (format version, discount factor and the list of arrays) and one .npy
+        file per array: P.npy for a dense P, or P_data.npy, P_indices.npy and P_indptr.npy for a CSR P, plus R.npy
+        and optionally V.npy, policy.npy and terminal_mask.npy (declared terminal states only). Labels that are all
+        strings or all integers are saved as arrays too, any others in the header. Since .npy files can be
+        memory-mapped, load does no parsing or copying and every process loading the same model shares one copy
+        through the page cache.
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {"R": self.R}
+        labels = {}
+        for key, values in (("state_labels", self.state_labels), ("action_labels", self.action_labels)):
+            if all(isinstance(v, str) for v in values) or all(isinstance(v, (int, np.integer)) for v in values):
+                arrays[key] = np.array(values)
+            else:
+                labels[key] = values
+        if self.is_sparse:
+            arrays.update(P_data=self.P.data, P_indices=self.P.indices, P_indptr=self.P.indptr)
+        else:
+            arrays["P"] = self.P
+        if V is not None:
+            arrays["V"] = np.asarray(V, dtype=np.float64)
+        if policy is not None:
+            arrays["policy"] = np.asarray(policy, dtype=np.intp)
+        if self.terminal_states is not None:
+            arrays["terminal_mask"] = self.terminal_mask
+
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+
+        header = {
+            "format": "mdp",
+            "version": MODEL_FORMAT_VERSION,
+            "sparse": self.is_sparse,
+            "discount_factor": self.discount_factor,
+            "tolerance": self.tolerance,
+            "arrays": sorted(arrays),
+            **labels
+        }
+        # written last, so a directory with a header always holds a complete model
+        with open(os.path.join(path, "header.json"), "w") as file:
+            json.dump(header, file)
+
+    @staticmethod
+    def _read_header(path):
+        with open(os.path.join(path, "header.json")) as file:
+            header = json.load(file)
+        if header.get("format") != "mdp" or header.get("version", 0) > MODEL_FORMAT_VERSION:
+            raise ValueError(f"{path} is not an MDP saved in format version {MODEL_FORMAT_VERSION} or older")
+
+        for key in ("state_labels", "action_labels"):
+            if key in header["arrays"]:
+                header[key] = np.load(os.path.join(path, key + ".npy")).tolist()
+            else:
+                # JSON turns tuple labels into lists, which are not hashable
+                header[key] = [tuple(label) if isinstance(label, list) else label for label in header[key]]
+        return header
+
+    @classmethod
+    def load(cls, path, mmap=True, validate=True):
+        """
+        Load a model written by save. With mmap=True the arrays are read-only memory maps of the saved files;
+        pass mmap=False for private in-memory copies, e.g. to edit the model with update_rows. validate runs the
+        same checks as __init__ (without normalizing, since memory-mapped arrays are read-only).
+        """
+        header = cls._read_header(path)
+        mmap_mode = "r" if mmap else None
+
+        def load_array(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+
+        if header["sparse"]:
+            num_rows = len(header["state_labels"]) * len(header["action_labels"])
+            # the saved CSR is already canonical, so build it around the arrays directly instead of through _to_csr
+            P = sp.csr_matrix((load_array("P_data"), load_array("P_indices"), load_array("P_indptr")),
+                              shape=(num_rows, len(header["state_labels"])), copy=False)
+            P.has_sorted_indices = True
+        else:
+            P = load_array("P")
+        R = load_array("R")
+
+        mdp = cls.__new__(cls)
+        mdp.states = mdp.state_labels = header["state_labels"]
+        mdp.actions = mdp.action_labels = header["action_labels"]
+        mdp.transition_matrix, mdp.reward_matrix = P, R
+        mdp.discount_factor = header["discount_factor"]
+        mdp.terminal_states = None
+        if "terminal_mask" in header["arrays"]:
+            terminal_mask = np.load(os.path.join(path, "terminal_mask.npy"))
+            mdp.terminal_states = [mdp.state_labels[i] for i in np.flatnonzero(terminal_mask)]
+        mdp.P, mdp.R = P, R
+        mdp.tolerance = header.get("tolerance", 1e-6)
+        mdp.validation_report = None
+        if validate:
+            mdp.validate()
+        return mdp
+
+    @classmethod
+    def load_solution(cls, path, mmap=True):
+        """
+        The V and policy arrays saved alongside a model (None for either one that was not saved).
+        """
+        header = cls._read_header(path)
+        mmap_mode = "r" if mmap else None
+        return tuple(np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) if name in header["arrays"]
+                     else None for name in ("V", "policy"))
+
+    def label_values(self, V):
+        """
+        Map an array of state values indexed by integer state index back to a {state: value} dictionary.
+        """
+        return {s: float(V[i]) for i, s in enumerate(self.state_labels)}
+
+    def label_policy(self, policy):
+        """
+        Map an array of integer action indices back to a {state: action} dictionary.
+        """
+        return {s: self.action_labels[int(policy[i])] for i, s in enumerate(self.state_labels)}
+
+    def transition_row(self, state_idx, action_idx):
+        """
+        Dense next state probabilities for one (state, action) pair, whichever storage P uses.
+        """
+        if self.is_sparse:
+            return self.P[state_idx * self.num_actions + action_idx].toarray().ravel()
+        return self.P[state_idx, action_idx]
+
     # Converting the Transition Prob, rewards and actions to Dictionary.
     def convert_to_dictionary(self):
         """
@@ -28,22 +395,29 @@ class MDP:
         - rewards: Dictionary of rewards for state-action pairs
         - actions: Dictionary of available actions for each state
         """
-        # Convert actions list to dictionary format
-        actions = {state: [act for act in self.actions] for state in self.states}
+        # Convert actions list to dictionary format, leaving out the actions a state doesn't offer
+        action_mask = self.action_mask
+        actions = {s: [a for j, a in enumerate(self.action_labels) if action_mask[i, j]]
+                   for i, s in enumerate(self.state_labels)}
 
         # Initialize the transition_probs and rewards dictionaries
-        transition_probs = {s: {} for s in self.states}
-        rewards = {s: {} for s in self.states}
+        transition_probs = {s: {} for s in self.state_labels}
+        rewards = {s: {} for s in self.state_labels}
 
-        for i, s in enumerate(self.states):
-            for j, a in enumerate(self.actions):
+        for i, s in enumerate(self.state_labels):
+            for j, a in enumerate(self.action_labels):
+                if not action_mask[i, j]:
+                    continue
                 transition_probs[s][a] = {}
-                for k, s_prime in enumerate(self.states):
+
+                # read from P rather than the nested list, so sparse models and rows edited by update_rows are covered
+                row = self.transition_row(i, j).tolist()
+                for k, s_prime in enumerate(self.state_labels):
                     # Set the transition probability for s' from the matrix
                     # transition_matrix[state][action][next_state]
-                    transition_probs[s][a][s_prime] = self.transition_matrix[i][j][k]
+                    transition_probs[s][a][s_prime] = row[k]
 
                 # Set the reward for action a in state s from the matrix
-                rewards[s][a] = self.reward_matrix[i][j]
+                rewards[s][a] = float(self.R[i, j])
 
         return transition_probs, rewards, actions
\ No newline at end of file
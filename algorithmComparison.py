@@ -4,10 +4,14 @@ Simple Algorithm Comparison Module for Policy Iteration vs Value Iteration
 
 import time
 import numpy as np
+from MDP import MDP
 from policyIteration import policyIteration
+from rolloutSimulator import parallelSimulateEpisodes, simulateEpisodes
+from solverProfiling import SolverStats
 from valueIteration import valueIteration
 
-def simulate_for_average_reward(states, transition_probs, rewards, start_state, policy, max_steps=100, num_episodes=1000):
+def simulate_for_average_reward(states, transition_probs, rewards, start_state, policy, max_steps=100, num_episodes=1000,
+                                rng=None, mdp=None):
     """
     Simulate the environment to compute the average reward over a number of episodes.
 
@@ -18,62 +22,86 @@ def simulate_for_average_reward(states, transition_probs, rewards, start_state,
     - start_state (Any): The initial state from which the simulation begins.
     - policy (dict): A mapping from states to actions representing the agent's policy.
     - max_steps (int, optional): Maximum number of steps for each episode. Defaults to 100.
-    - num_episodes (int, optional): Number of episodes to simulate. Defaults to 1000.
+    - num_episodes (int, optional): Number of episodes to simulate, at least 1. Defaults to 1000.
+    - rng (optional): np.random.Generator or seed used for sampling transitions.
+    - mdp (optional): The model compiled to an MDP (e.g. MDP.from_dictionary). It is reused, along with its cached
+                      transition sampler, instead of compiling the dictionaries again on every call.
 
     Returns:
     - float: The average reward accumulated per episode over the specified number of episodes.
     """
-    total_rewards = 0
-    terminal_states = {'Destination Reached', 'Acident'}
-    
-    for _ in range(num_episodes):
-        current_state = start_state
-        episode_reward = 0
-        
-        for _ in range(max_steps):
-            if current_state in terminal_states:
-                break
-                
-            action = policy[current_state]
-            
-            # Get reward for current state-action pair
-            reward = rewards[current_state][action]
-            episode_reward += reward
-            
-            # Sample the next state based on the transition probabilities
-            prob_list = []
-            for s_prime in states:
-                prob_list.append(transition_probs[current_state][action][s_prime])
-            next_state = np.random.choice(states, p=prob_list)
-            
-            current_state = next_state
-            
-        total_rewards += episode_reward
-        
-    return total_rewards / num_episodes
-
-def compare_algorithms(states, actions, transition_probs, rewards, start_state='Clear Road', gamma=0.9, theta=1e-3):
+    if num_episodes < 1:
+        raise ValueError(f"The number of episodes must be at least one, got {num_episodes}")
+    sampler = None if mdp is None else mdp.transition_sampler()
+    mdp, policy, terminal_mask = _compile_rollout(states, transition_probs, rewards, policy, mdp)
+    episode_rewards = simulateEpisodes(mdp.P, mdp.R, policy, mdp.state_index[start_state], max_steps, num_episodes,
+                                       terminal_mask, rng, sampler)
+
+    return episode_rewards.mean()
+
+def rollout_reward_summary(states, transition_probs, rewards, start_state, policy, max_steps=100, num_episodes=1000,
+                           seed=None, num_workers=None, mdp=None):
+    """
+    Like simulate_for_average_reward, but spreads the episodes over worker processes and also reports the
+    spread of the returns (see rolloutSimulator.parallelSimulateEpisodes).
+
+    Parameters:
+    - seed: Integer seed; the same seed and number of workers reproduce the same summary exactly
+    - num_workers: Number of worker processes (defaults to the CPU count)
+    - mdp: Optional compiled MDP of the model, as for simulate_for_average_reward
+
+    Returns:
+    - dict: "episodes", "mean", "variance", "std_error" and a 95% "confidence_interval" of the episode returns.
+    """
+    mdp, policy, terminal_mask = _compile_rollout(states, transition_probs, rewards, policy, mdp)
+    return parallelSimulateEpisodes(mdp.P, mdp.R, policy, mdp.state_index[start_state], max_steps, num_episodes,
+                                    terminal_mask, seed, num_workers)
+
+def _compile_rollout(states, transition_probs, rewards, policy, mdp=None):
+    # compile to arrays so all episodes can be advanced together (see rolloutSimulator)
+    if mdp is None:
+        actions = {state: list(transition_probs[state]) for state in states}
+        mdp = MDP.from_dictionary(states, actions, transition_probs, rewards)
+    policy = np.array([mdp.action_index[policy[state]] for state in mdp.state_labels])
+    # episodes end on entering an absorbing state (see MDP.terminal_mask)
+    return mdp, policy, mdp.terminal_mask
+
+def compare_algorithms(states, actions, transition_probs, rewards, start_state='Clear Road', gamma=0.9, theta=1e-3,
+                       seed=0, num_workers=1, profile=False):
     """
     Compare Policy Iteration and Value Iteration algorithms.
+
+    The average rewards come from seeded rollouts, so repeated comparisons with the same seed and num_workers
+    report the same numbers. num_workers > 1 runs the rollouts on that many worker processes. With profile=True
+    each algorithm's "stats" holds a SolverStats with its per-phase timings and counts (see solverProfiling).
     
     Returns a dictionary with comparison results including timing and performance metrics.
     """
+    # independent rollout streams for the two policies
+    PI_seed, VI_seed = np.random.SeedSequence(seed).spawn(2)
+    PI_stats = SolverStats() if profile else None
+    VI_stats = SolverStats() if profile else None
+    # compiled once for the rollouts of both policies
+    mdp = MDP.from_dictionary(states, actions, transition_probs, rewards)
+
     print("🚗 Running Algorithm Comparison...")
     print("=" * 50)
     
     # Policy Iteration
     print("🔄 Policy Iteration...")
-    start_time = time.time()
-    PI_values, PI_policy = policyIteration(states, actions, transition_probs, rewards, gamma, theta)
-    PI_time = time.time() - start_time
-    PI_avg_reward = simulate_for_average_reward(states, transition_probs, rewards, start_state, PI_policy)
+    start_time = time.perf_counter()
+    PI_values, PI_policy = policyIteration(states, actions, transition_probs, rewards, gamma, theta, stats=PI_stats)
+    PI_time = time.perf_counter() - start_time
+    PI_rollouts = rollout_reward_summary(states, transition_probs, rewards, start_state, PI_policy, seed=PI_seed,
+                                         num_workers=num_workers, mdp=mdp)
     
     print("🎯 Value Iteration...")
     # Value Iteration
-    start_time = time.time()
-    VI_values, VI_policy = valueIteration(states, actions, transition_probs, rewards, gamma, theta)
-    VI_time = time.time() - start_time
-    VI_avg_reward = simulate_for_average_reward(states, transition_probs, rewards, start_state, VI_policy)
+    start_time = time.perf_counter()
+    VI_values, VI_policy = valueIteration(states, actions, transition_probs, rewards, gamma, theta, stats=VI_stats)
+    VI_time = time.perf_counter() - start_time
+    VI_rollouts = rollout_reward_summary(states, transition_probs, rewards, start_state, VI_policy, seed=VI_seed,
+                                         num_workers=num_workers, mdp=mdp)
 
     # Metrics
     value_diff = sum([abs(VI_values[state] - PI_values[state]) for state in states])
@@ -84,13 +112,17 @@ def compare_algorithms(states, actions, transition_probs, rewards, start_state='
             "Convergence Time": VI_time,
             "Value Function": VI_values,
             "Policy": VI_policy,
-            "Average Reward": VI_avg_reward
+            "Average Reward": VI_rollouts["mean"],
+            "Reward Confidence Interval": VI_rollouts["confidence_interval"],
+            "stats": VI_stats
         },
         "Policy Iteration": {
             "Convergence Time": PI_time,
             "Value Function": PI_values,
             "Policy": PI_policy,
-            "Average Reward": PI_avg_reward
+            "Average Reward": PI_rollouts["mean"],
+            "Reward Confidence Interval": PI_rollouts["confidence_interval"],
+            "stats": PI_stats
         },
         "Value Function Difference (Sum of Absolute Differences)": value_diff,
         "Policy Difference (Number of Different Actions)": policy_diff
@@ -1,7 +1,8 @@
 from MDP import MDP
 
-states = {'UT_H', 'UT_L', 'DT_H', 'DT_L', 'C_H', 'C_L', 'PS_H', 'PS_L', 'PD_H', 'PD_L'}
-actions = {'Buy', 'Hold', 'Sell'}
+# listed in the row order of reward_matrix and transition_matrix below
+states = ['UT_H', 'UT_L', 'DT_H', 'DT_L', 'C_H', 'C_L', 'PS_H', 'PS_L', 'PD_H', 'PD_L']
+actions = ['Buy', 'Hold', 'Sell']
 
 #R(s,a)
 # rows represent current state, columns represent actions
@@ -75,7 +76,7 @@ transition_matrix = [
     # S9: PD_H - Price Drop + High Volume
     [
         [0.20, 0.10, 0.05, 0.00, 0.10, 0.10, 0.10, 0.05, 0.20, 0.10],  # Buy (anticipating price bounce back)
-        [0.10, 0.05, 0.10, 0.05, 0.15, 0.10, 0.05, 0.00, 0.30, 0.20],  # Hold
+        [0.10, 0.05, 0.10, 0.05, 0.15, 0.10, 0.05, 0.00, 0.20, 0.20],  # Hold
         [0.05, 0.00, 0.15, 0.05, 0.15, 0.10, 0.00, 0.00, 0.40, 0.10]   # Sell
     ],
     # S10: PD_L - Price Drop + Low Volume
@@ -100,26 +101,28 @@ transition_matrix, reward_matrix, actions = autoStockTraderMDP.convert_to_dictio
 Dynamic Programming algorithms with Visual Comparison
 """
 
-from visualComparison import visual_algorithm_comparison
-from plotDescription import describe_plots
+# the model above can be imported (e.g. by benchmarkSuite) without running the comparison
+if __name__ == "__main__":
+    from visualComparison import visual_algorithm_comparison
+    from plotDescription import describe_plots
 
-# Run visual algorithm comparison
-print("SELF-DRIVING CAR MDP: VISUAL ALGORITHM ANALYSIS")
-print("=" * 60)
+    # Run visual algorithm comparison
+    print("SELF-DRIVING CAR MDP: VISUAL ALGORITHM ANALYSIS")
+    print("=" * 60)
 
-results = visual_algorithm_comparison(
-    states=autoStockTraderMDP.states,
-    actions=actions,
-    transition_matrix=transition_matrix,
-    reward_matrix=reward_matrix,
-    start_state='UT_H',
-    gamma=0.9,
-    theta=1e-3,
-    save_plots=True  # Set to True to save plots as files
-)
+    results = visual_algorithm_comparison(
+        states=autoStockTraderMDP.states,
+        actions=actions,
+        transition_matrix=transition_matrix,
+        reward_matrix=reward_matrix,
+        start_state='UT_H',
+        gamma=0.9,
+        theta=1e-3,
+        save_plots=True  # Set to True to save plots as files
+    )
 
-print("\nVisual comparison complete!")
-print("Three plots have been saved:")
-print("   • value_evolution.png")
-print("   • convergence_comparison.png") 
-print("   • final_values_comparison.png")
+    print("\nVisual comparison complete!")
+    print("Three plots have been saved:")
+    print("   • value_evolution.png")
+    print("   • convergence_comparison.png") 
+    print("   • final_values_comparison.png")
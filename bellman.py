@@ -0,0 +1,191 @@
+"""
+Batched Bellman Backups
+
+    array versions of the per-state loops in valueIteration / policyIteration.
+    P is the transition model held by MDP, either the dense (S, A, S') tensor or a CSR matrix of shape (S*A, S)
+    whose row s*A + a holds the successors of (s, a). R is the (S, A) reward array and V a length-S array of
+    state values indexed by integer state index.
+
+    With a sparse P every product below only visits the nonzero successors of each (state, action) pair.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+"""
+Q-Table Computation using the Bellman Optimality Equation
+
+    computes the action value of every (state, action) pair in one step
+
+    Q[s, a] = R[s, a] + gamma * sum over s' of P[s, a, s'] * V[s']
+            = R + gamma * P @ V
+"""
+
+def computeQValues(P, R, V, gamma):
+    num_states, num_actions = R.shape
+
+    # treat P as a (S*A, S') matrix so the expectation over successors is a single matrix-vector product
+    if sp.issparse(P):
+        expected_next_values = P @ V
+    else:
+        expected_next_values = P.reshape(num_states * num_actions, -1) @ V
+
+    return R + gamma * expected_next_values.reshape(num_states, num_actions)
+
+"""
+Q-Table of a Value Function
+
+    computeQValues with the rows of terminal states replaced by the value of taking each action once and then
+    staying put, Q[s, a] = R[s, a] + gamma * V[s], so the argmax of every row matches the solvers' policies
+"""
+
+def qTable(P, R, V, gamma, terminal_mask=None):
+    Q = computeQValues(P, R, V, gamma)
+    if terminal_mask is not None and np.any(terminal_mask):
+        Q[terminal_mask] = R[terminal_mask] + gamma * V[terminal_mask, None]
+    return Q
+
+"""
+Bellman Backup
+
+    one synchronous backup of every state, returning both the new value function and the
+    greedy policy taken from the same Q-table (max and argmax along the action axis)
+"""
+
+def bellmanBackup(P, R, V, gamma):
+    Q = computeQValues(P, R, V, gamma)
+
+    # argmax returns the first maximising action, matching the strict ">" tie-breaking of the loop versions
+    policy = Q.argmax(axis=1)
+    new_V = Q[np.arange(Q.shape[0]), policy]
+
+    return new_V, policy
+
+"""
+Policy Model
+
+    the Markov chain induced by following a fixed policy:
+    P_pi[s, s'] = P[s, policy[s], s'] and R_pi[s] = R[s, policy[s]]
+"""
+
+def policyModel(P, R, policy):
+    num_states, num_actions = R.shape
+    state_indices = np.arange(num_states)
+
+    if sp.issparse(P):
+        P_pi = P[state_indices * num_actions + policy]
+    else:
+        P_pi = P[state_indices, policy]
+
+    return P_pi, R[state_indices, policy]
+
+"""
+Stopping Threshold
+
+    "delta":   stop once the largest change in V over a sweep is below theta
+    "epsilon": stop once it is below theta*(1-gamma)/(2*gamma), the standard bound under which the
+               greedy policy with respect to V is theta-optimal (Puterman, Theorem 6.3.1)
+"""
+
+def stoppingThreshold(theta, gamma, stopping="delta"):
+    if stopping == "delta":
+        return theta
+    if stopping != "epsilon":
+        raise ValueError(f"Unknown stopping rule {stopping!r}")
+    if not 0 <= gamma < 1:
+        raise ValueError("The epsilon-optimal stopping rule requires 0 <= gamma < 1")
+    if gamma == 0:
+        # a single backup is already exact
+        return float("inf")
+    return theta * (1 - gamma) / (2 * gamma)
+
+"""
+Suboptimality Bound
+
+    if the Bellman residual of V is ||T V - V|| = residual (max norm), the greedy policy with respect to V is within
+    2 * gamma * residual / (1 - gamma) of optimal in every state (Puterman, Theorem 6.3.1), the inverse of the
+    "epsilon" stopping rule above. bellmanResidual measures it for the non-terminal states, whose values are the
+    only ones that are backed up.
+"""
+
+def suboptimalityBound(residual, gamma):
+    if gamma >= 1:
+        return 0.0 if residual == 0 else float("inf")
+    return 2 * gamma * residual / (1 - gamma)
+
+def bellmanResidual(P, R, V, gamma, terminal_mask=None):
+    """
+    (max-norm Bellman residual of V, greedy policy with respect to V); terminal states keep their best-reward action.
+    """
+    new_V, policy = bellmanBackup(P, R, V, gamma)
+    changes = np.abs(new_V - V)
+    if terminal_mask is not None:
+        changes[terminal_mask] = 0
+        policy[terminal_mask] = R[terminal_mask].argmax(axis=1)
+    return float(np.max(changes, initial=0)), policy
+
+"""
+Single-State Backup
+
+    Bellman optimality backup of one state, used by in-place schedules (Gauss-Seidel, prioritized sweeping)
+    that update states one at a time against the latest V. Returns (value, greedy action) for the state.
+"""
+
+def stateBackupFunction(P, R, gamma):
+    num_states, num_actions = R.shape
+
+    if sp.issparse(P):
+        indptr, indices, data = P.indptr, P.indices, P.data
+        # action index of every stored entry, so each state's nonzero successors can be summed per action
+        entry_actions = np.repeat(np.tile(np.arange(num_actions), num_states), np.diff(indptr))
+
+        def backup(V, state):
+            start, end = indptr[state * num_actions], indptr[(state + 1) * num_actions]
+            expected_next_values = np.bincount(entry_actions[start:end], weights=data[start:end] * V[indices[start:end]],
+                                               minlength=num_actions)
+            action_values = R[state] + gamma * expected_next_values
+            action = action_values.argmax()
+            return action_values[action], action
+    else:
+        def backup(V, state):
+            action_values = R[state] + gamma * (P[state] @ V)
+            action = action_values.argmax()
+            return action_values[action], action
+
+    return backup
+
+"""
+Predecessor Graph
+
+    reverse of the transition structure: row s' of the returned (S, S) CSR matrix lists every state s that can
+    reach s' in one step, weighted by max over actions of P[s, a, s']. a change of c in V[s'] can change the
+    Bellman residual of s by at most gamma * weight * c.
+"""
+
+def predecessorGraph(P, num_actions):
+    if sp.issparse(P):
+        # rows a, a + A, a + 2A, ... hold action a for every state
+        weights = P[0::num_actions]
+        for action in range(1, num_actions):
+            weights = weights.maximum(P[action::num_actions])
+    else:
+        weights = sp.csr_matrix(P.max(axis=1))
+
+    return sp.csr_matrix(weights.T)
+
+"""
+Terminal States
+
+    a terminal state ends the episode: solvers treat it as absorbing, pin its value to that of staying there
+    forever under its best action, V = max_a R[s, a] / (1 - gamma) (0 when its rewards are 0), and never back
+    it up. the vectorized solvers back up every row of P and re-pin the terminal values afterwards, which costs
+    the few terminal rows but no copy of P.
+"""
+
+def terminalValues(R, terminal_mask, gamma):
+    best_rewards = R[terminal_mask].max(axis=1)
+    if gamma >= 1:
+        if np.any(best_rewards != 0):
+            raise ValueError("Terminal states with nonzero rewards need gamma < 1 to have a finite value")
+        return np.zeros_like(best_rewards)
+    return best_rewards / (1 - gamma)
@@ -0,0 +1,375 @@
+"""
+Solver Benchmarks
+
+    times the array solvers on seeded synthetic MDPs of growing size, so solver changes can be measured and
+    regressions caught before they ship. every (family, size) model is generated from the seed alone, so two
+    runs with the same seed solve exactly the same models.
+
+    families:
+        "random_dense":  dense P with every successor reachable (capped at 1000 states, P is S*A*S floats)
+        "random_sparse": CSR P with SPARSE_SUCCESSORS random successors per (state, action)
+        "gridworld":     square grid with 4 slippery moves and an absorbing goal in the far corner
+        "chain":         a chain where pushing forward pays off only at the far end
+        "driving":       copies of the self-driving car model, linked by a small chance of moving to the next copy
+        "stock":         copies of the stock trading model, linked the same way
+
+    for each solver the wall time is the best of a few repeats (time.perf_counter), followed by one extra run
+    under tracemalloc for the peak traced memory. results are written to JSON and can be compared against a
+    stored baseline run:
+
+        python benchmarkSuite.py --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import zlib
+import numpy as np
+import scipy
+import scipy.sparse as sp
+from MDP import MDP
+from policyIteration import batchedPolicyIteration
+from valueIteration import batchedValueIteration, gaussSeidelValueIteration, prioritizedSweeping
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_SIZES = (10, 100, 1000, 10_000, 100_000)
+SPARSE_SUCCESSORS = 5
+NUM_ACTIONS = 4
+
+# probability that a scaled-up copy of a model moves on to the next copy instead
+COPY_LINK_PROBABILITY = 0.05
+
+"""
+Model Families
+    each generator takes the requested number of states and a np.random.Generator and returns an MDP.
+    the actual number of states may be rounded (gridworld sides, whole model copies).
+"""
+
+def randomDenseMDP(num_states, rng):
+    P = rng.random((num_states, NUM_ACTIONS, num_states))
+    P /= P.sum(axis=2, keepdims=True)
+    R = rng.normal(size=(num_states, NUM_ACTIONS))
+    return MDP(range(num_states), range(NUM_ACTIONS), P, R)
+
+def randomSparseMDP(num_states, rng, successors=SPARSE_SUCCESSORS):
+    num_rows = num_states * NUM_ACTIONS
+    columns = rng.integers(0, num_states, size=(num_rows, successors))
+    probabilities = rng.random((num_rows, successors))
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    # repeated successors are summed by the CSR constructor
+    P = sp.csr_matrix((probabilities.ravel(), (np.repeat(np.arange(num_rows), successors), columns.ravel())),
+                      shape=(num_rows, num_states))
+    R = rng.normal(size=(num_states, NUM_ACTIONS))
+    return MDP(range(num_states), range(NUM_ACTIONS), P, R)
+
+def gridworldMDP(num_states, rng, slip=0.2):
+    side = max(int(round(np.sqrt(num_states))), 2)
+    num_states = side * side
+    rows, columns = np.divmod(np.arange(num_states), side)
+
+    # up, down, left, right; moving into a wall leaves the agent where it is
+    moves = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    def target(move):
+        next_rows = np.clip(rows + move[0], 0, side - 1)
+        next_columns = np.clip(columns + move[1], 0, side - 1)
+        return next_rows * side + next_columns
+
+    # the intended move, or with probability slip one of the two perpendicular ones; the goal only loops to itself
+    goal = num_states - 1
+    sources = [np.arange(goal * NUM_ACTIONS, num_states * NUM_ACTIONS)]
+    targets = [np.full(NUM_ACTIONS, goal)]
+    probabilities = [np.ones(NUM_ACTIONS)]
+    for a, move in enumerate(moves):
+        perpendicular = [m for m in moves if m[0] * move[0] + m[1] * move[1] == 0 and m != move]
+        for outcome, probability in [(move, 1 - slip)] + [(m, slip / 2) for m in perpendicular]:
+            sources.append(np.arange(goal) * NUM_ACTIONS + a)
+            targets.append(target(outcome)[:goal])
+            probabilities.append(np.full(goal, probability))
+
+    P = sp.csr_matrix((np.concatenate(probabilities), (np.concatenate(sources), np.concatenate(targets))),
+                      shape=(num_states * NUM_ACTIONS, num_states))
+
+    # every step costs 1 until the goal is reached; slightly noisy so ties between routes are broken
+    R = -1 - 0.01 * rng.random((num_states, NUM_ACTIONS))
+    R[goal] = 0
+    return MDP(range(num_states), range(NUM_ACTIONS), P, R)
+
+def chainMDP(num_states, rng, slip=0.1):
+    # action 0 moves forward (falling back to the start with probability slip), action 1 returns to the start
+    states = np.arange(num_states)
+    forward = np.minimum(states + 1, num_states - 1)
+    start = np.zeros(num_states, dtype=np.intp)
+
+    rows = np.concatenate([states * 2, states * 2, states * 2 + 1, states * 2 + 1])
+    columns = np.concatenate([forward, start, start, forward])
+    probabilities = np.repeat([1 - slip, slip, 1 - slip, slip], num_states)
+    P = sp.csr_matrix((probabilities, (rows, columns)), shape=(num_states * 2, num_states))
+
+    R = np.zeros((num_states, 2))
+    R[:, 1] = 0.2 + 0.01 * rng.random(num_states)
+    R[-1, 0] = 10
+    return MDP(range(num_states), range(2), P, R)
+
+def scaledMDP(base, num_states, rng):
+    """
+    Copies of base, where every non-terminal transition moves to the same successor in the next copy with
+    probability COPY_LINK_PROBABILITY. rewards get a little noise so the copies are not interchangeable.
+    """
+    base_states, num_actions = base.R.shape
+    copies = max(num_states // base_states, 1)
+    P = sp.csr_matrix(base.P) if base.is_sparse else sp.csr_matrix(base.P.reshape(base_states * num_actions, -1))
+
+    link = np.repeat(np.where(base.terminal_mask, 0.0, COPY_LINK_PROBABILITY), num_actions)
+    link = np.tile(link, copies)
+    next_copy = sp.eye(copies, k=1, format="csr") + sp.eye(copies, k=1 - copies, format="csr")
+    P = (sp.diags(1 - link) @ sp.kron(sp.eye(copies), P, format="csr")
+         + sp.diags(link) @ sp.kron(next_copy, P, format="csr"))
+
+    R = np.tile(base.R, (copies, 1)) + 0.01 * rng.standard_normal((copies * base_states, num_actions))
+    return MDP(range(copies * base_states), range(num_actions), sp.csr_matrix(P), R)
+
+def _drivingMDP(num_states, rng):
+    from selfDrivingCar import selfDrivingCarMDP
+    return scaledMDP(selfDrivingCarMDP, num_states, rng)
+
+def _stockMDP(num_states, rng):
+    from autoStockTrader import autoStockTraderMDP
+    return scaledMDP(autoStockTraderMDP, num_states, rng)
+
+FAMILIES = {
+    "random_dense": (randomDenseMDP, 1000),
+    "random_sparse": (randomSparseMDP, None),
+    "gridworld": (gridworldMDP, None),
+    "chain": (chainMDP, None),
+    "driving": (_drivingMDP, None),
+    "stock": (_stockMDP, None),
+}
+
+def generateMDP(family, num_states, seed=0):
+    """
+    The model of this family and size for this seed; the same arguments always give the same model.
+    """
+    generator, _ = FAMILIES[family]
+    rng = np.random.default_rng([seed, zlib.crc32(family.encode()), num_states])
+    return generator(num_states, rng)
+
+"""
+Solvers
+    each runner solves an MDP and returns (sweeps, backups): the number of iterations (policy iteration rounds
+    for policy iteration) and the number of single-state Bellman backups, or None where that is not tracked.
+    the per-state Python loops of Gauss-Seidel and prioritized sweeping are capped at smaller sizes.
+"""
+
+def _counter():
+    count = [0]
+    def observer(solver, iteration, delta, V):
+        count[0] = iteration
+    return count, observer
+
+def _valueIteration(mdp, gamma, theta):
+    count, observer = _counter()
+    batchedValueIteration(mdp.P, mdp.R, gamma, theta, observers=[observer], terminal_mask=mdp.terminal_mask)
+    return count[0], count[0] * int(np.count_nonzero(~mdp.terminal_mask))
+
+def _gaussSeidel(mdp, gamma, theta):
+    count, observer = _counter()
+    gaussSeidelValueIteration(mdp.P, mdp.R, gamma, theta, observers=[observer], terminal_mask=mdp.terminal_mask)
+    return count[0], count[0] * int(np.count_nonzero(~mdp.terminal_mask))
+
+def _prioritizedSweeping(mdp, gamma, theta):
+    _, _, backups = prioritizedSweeping(mdp.P, mdp.R, gamma, theta, terminal_mask=mdp.terminal_mask)
+    return -(-backups // mdp.num_states), backups
+
+def _policyIteration(mdp, gamma, theta):
+    count, observer = _counter()
+    batchedPolicyIteration(mdp.P, mdp.R, gamma, theta, observers=[observer], terminal_mask=mdp.terminal_mask)
+    return count[0], None
+
+SOLVERS = {
+    "value_iteration": (_valueIteration, None),
+    "gauss_seidel": (_gaussSeidel, 1000),
+    "prioritized_sweeping": (_prioritizedSweeping, 1000),
+    "policy_iteration": (_policyIteration, None),
+}
+
+"""
+Running and Comparing
+"""
+
+def _maxRSS():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def benchmarkSolver(solver, mdp, gamma=0.9, theta=1e-3, repeats=3):
+    """
+    Time one solver on one model. Returns a result dictionary (see runBenchmarks).
+    """
+    runner, _ = SOLVERS[solver]
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sweeps, backups = runner(mdp, gamma, theta)
+        times.append(time.perf_counter() - start)
+
+    # memory is measured in a separate run, since tracing allocations slows the solver down
+    tracemalloc.start()
+    try:
+        runner(mdp, gamma, theta)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best_time = min(times)
+    return {
+        "solver": solver,
+        "states": mdp.num_states,
+        "actions": mdp.num_actions,
+        "transitions": int(mdp.P.nnz) if mdp.is_sparse else int(np.count_nonzero(mdp.P)),
+        "time": best_time,
+        "times": times,
+        "sweeps": int(sweeps),
+        "backups": backups,
+        "backups_per_second": backups / best_time if backups is not None and best_time > 0 else None,
+        "peak_memory_bytes": int(peak_memory)
+    }
+
+def runBenchmarks(families=None, sizes=DEFAULT_SIZES, solvers=None, gamma=0.9, theta=1e-3, repeats=3, seed=0,
+                  progress=None):
+    """
+    Benchmark every solver on every (family, size) model.
+
+    Parameters:
+    - families, solvers: Names to run (default all, see FAMILIES and SOLVERS)
+    - sizes: Requested numbers of states; sizes above a family's or solver's cap are skipped
+    - gamma, theta: Passed to every solver
+    - repeats: Timed runs per solver and model; the fastest one is reported
+    - seed: Seed the models are generated from
+    - progress: Optional callable, called with each result as it is produced
+
+    Returns:
+    - dict with "metadata" (versions, platform, settings and "max_rss_bytes", the process's memory high-water
+      mark over the whole run, which can't be attributed to any one result) and a list of "results", each
+      holding the family, the requested and actual size, "time" (best of the repeats, seconds), "sweeps",
+      "backups", "backups_per_second" and "peak_memory_bytes" (tracemalloc, per solve)
+    """
+    families = list(FAMILIES) if families is None else families
+    solvers = list(SOLVERS) if solvers is None else solvers
+
+    results = []
+    for family in families:
+        _, family_cap = FAMILIES[family]
+        for size in sizes:
+            if family_cap is not None and size > family_cap:
+                continue
+            mdp = generateMDP(family, size, seed)
+            for solver in solvers:
+                _, solver_cap = SOLVERS[solver]
+                if solver_cap is not None and mdp.num_states > solver_cap:
+                    continue
+                result = {"family": family, "size": size, **benchmarkSolver(solver, mdp, gamma, theta, repeats)}
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+
+    metadata = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "gamma": gamma,
+        "theta": theta,
+        "repeats": repeats,
+        "seed": seed,
+        "max_rss_bytes": _maxRSS()
+    }
+    return {"metadata": metadata, "results": results}
+
+def compareResults(current, baseline, tolerance=0.25, min_time=1e-3):
+    """
+    Compare a run against a baseline run, matching results by family, size and solver.
+
+    A result regresses when its time or peak memory grew by more than tolerance (a fraction), or when it needs
+    more sweeps than before. Times below min_time seconds in both runs are too noisy to compare.
+
+    Returns a list of regressions, each a dict with the family, size, solver, "metric", "baseline", "current"
+    and "ratio".
+    """
+    baseline_results = {(r["family"], r["size"], r["solver"]): r for r in baseline["results"]}
+
+    regressions = []
+    for result in current["results"]:
+        before = baseline_results.get((result["family"], result["size"], result["solver"]))
+        if before is None:
+            continue
+
+        checks = [("sweeps", 0), ("peak_memory_bytes", tolerance)]
+        if max(result["time"], before["time"]) >= min_time:
+            checks.append(("time", tolerance))
+
+        for metric, allowed in checks:
+            if before[metric] and result[metric] > before[metric] * (1 + allowed):
+                regressions.append({
+                    "family": result["family"],
+                    "size": result["size"],
+                    "solver": result["solver"],
+                    "metric": metric,
+                    "baseline": before[metric],
+                    "current": result[metric],
+                    "ratio": result[metric] / before[metric]
+                })
+    return regressions
+
+def _printResult(result):
+    rate = result["backups_per_second"]
+    rate = f"{rate:,.0f} backups/s" if rate is not None else ""
+    print(f"{result['family']:>14} {result['states']:>8} {result['solver']:>22} {result['time']:9.4f}s "
+          f"{result['sweeps']:6} sweeps {rate:>20} {result['peak_memory_bytes'] / 2**20:9.1f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MDP solvers on synthetic models")
+    parser.add_argument("--families", nargs="+", choices=list(FAMILIES), help="model families (default all)")
+    parser.add_argument("--solvers", nargs="+", choices=list(SOLVERS), help="solvers (default all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="numbers of states")
+    parser.add_argument("--gamma", type=float, default=0.9)
+    parser.add_argument("--theta", type=float, default=1e-3)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.families, args.sizes, args.solvers, args.gamma, args.theta, args.repeats, args.seed,
+                            progress=_printResult)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compareResults(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['family']} {regression['size']} {regression['solver']}: "
+                  f"{regression['metric']} {regression['baseline']:.4g} -> {regression['current']:.4g} "
+                  f"({regression['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Compiled Policies
+
+    a solved policy packed for fast lookups by integer state index, for controllers that query it far more often
+    than it is solved. built from a Q-table (valueIteration / policyIteration with return_q=True, or bellman.qTable),
+    it holds each state's actions ranked by Q value, best first, in the smallest integer dtype that fits:
+
+        policy.act(s)                  greedy action of state s, as a python int (a list lookup, no numpy scalar)
+        policy.act_batch(states)       greedy actions of an array of states, as np.intp (also with allowed=)
+        policy.top_k(s, k)             the k best actions of state s, best first
+        policy.act_batch(states, allowed=mask)
+                                       best action whose entry in the (N, A) boolean mask is True, i.e. the
+                                       fallback when the greedy action is unavailable; -1 if none of the ranked
+                                       actions is allowed
+
+    ties rank the lower action index first, the same tie-breaking as the solvers' argmax. top_k=k keeps only the
+    k best actions of every state to save memory (S * k small integers instead of S * A).
+"""
+
+import numpy as np
+from bellman import qTable
+
+
+class CompiledPolicy:
+    def __init__(self, Q, state_labels=None, action_labels=None, top_k=None):
+        """
+        Parameters:
+        - Q: (S, A) array of action values
+        - state_labels, action_labels: Optional labels of the rows and columns of Q, for the labelled lookups
+        - top_k: Number of ranked actions kept per state (default: all of them)
+        """
+        Q = np.asarray(Q, dtype=np.float64)
+        self.num_actions = num_actions = Q.shape[1]
+        self.k = num_actions if top_k is None else max(1, min(top_k, num_actions))
+
+        # stable sort of -Q keeps tied actions in index order, so column 0 is the argmax
+        ranking = np.argsort(-Q, axis=1, kind="stable")[:, :self.k]
+        self.ranking = np.ascontiguousarray(ranking, dtype=np.min_scalar_type(max(num_actions - 1, 0)))
+        # greedy actions as np.intp, the dtype act_batch returns with and without a mask (which needs -1)
+        self.actions = self.ranking[:, 0].astype(np.intp)
+        self._actions = self.actions.tolist()
+
+        self.state_labels = None if state_labels is None else list(state_labels)
+        self.action_labels = None if action_labels is None else list(action_labels)
+        self.state_index = None if state_labels is None else {s: i for i, s in enumerate(self.state_labels)}
+
+    @classmethod
+    def from_values(cls, P, R, V, gamma, terminal_mask=None, state_labels=None, action_labels=None, top_k=None):
+        """
+        Compile the greedy policy of a value array V (see bellman.qTable).
+        """
+        return cls(qTable(P, R, np.asarray(V, dtype=np.float64), gamma, terminal_mask), state_labels, action_labels,
+                   top_k)
+
+    @classmethod
+    def from_mdp(cls, mdp, V, gamma=None, top_k=None):
+        """
+        Compile the greedy policy of an MDP's value array V, labelled like the MDP.
+        """
+        gamma = mdp.discount_factor if gamma is None else gamma
+        return cls.from_values(mdp.P, mdp.R, V, gamma, mdp.terminal_mask, mdp.state_labels, mdp.action_labels, top_k)
+
+    @property
+    def num_states(self):
+        return self.ranking.shape[0]
+
+    def act(self, state_idx):
+        return self._actions[state_idx]
+
+    def act_batch(self, state_indices, allowed=None):
+        """
+        Greedy actions of an array of state indices, or with allowed (an (N, A) boolean mask, one row per state
+        queried) the best-ranked allowed action of each, -1 where none of the ranked actions is allowed. both
+        return np.intp arrays.
+        """
+        if allowed is None:
+            return self.actions[state_indices]
+
+        ranked = self.ranking[state_indices]
+        permitted = np.take_along_axis(np.asarray(allowed, dtype=bool), ranked.astype(np.intp), axis=1)
+        first = permitted.argmax(axis=1)
+        chosen = ranked[np.arange(len(ranked)), first].astype(np.intp)
+        chosen[~permitted.any(axis=1)] = -1
+        return chosen
+
+    def top_k(self, state_idx, k=None):
+        """
+        The k best actions of a state (default: all ranked ones), best first.
+        """
+        return self.ranking[state_idx, :k]
+
+    def top_k_batch(self, state_indices, k=None):
+        return self.ranking[state_indices, :k]
+
+    def act_label(self, state):
+        """
+        Greedy action label of a state label (needs state_labels and action_labels).
+        """
+        return self.action_labels[self._actions[self.state_index[state]]]
+
+    def label_policy(self):
+        """
+        The policy as a {state: action} dictionary (needs state_labels and action_labels).
+        """
+        return {state: self.action_labels[action] for state, action in zip(self.state_labels, self._actions)}
+
+    def __len__(self):
+        return self.num_states
+
+    def __repr__(self):
+        return f"CompiledPolicy(states={self.num_states}, actions={self.num_actions}, top_k={self.k})"
@@ -0,0 +1,172 @@
+"""
+Finite-Horizon Backward Induction
+
+    optimal control over a fixed number of steps H instead of the infinite discounted horizon. with H steps to go
+    the best action generally differs from the one with many steps left, so the policy is time-indexed:
+    policy[t, s] is the action to take in state s at step t (H - t steps left) and V[t, s] the expected return
+    of the remaining steps. gamma may be 1, since the sum over H steps is always finite.
+
+    Pseudo Code:
+        V_H = terminal values (0 by default)
+        For t = H-1 down to 0:
+            Q = R + gamma * P @ V_{t+1}
+            policy[t] = argmax of Q over actions, V_t = max of Q over actions
+        Return V and policy
+
+    exactly H vectorized backups, so the cost is fixed in advance rather than depending on convergence.
+    terminal states (see MDP.terminal_mask) collect their best reward on every remaining step and are never
+    backed up. policies are stored in the smallest integer dtype that fits the actions and values in value_dtype
+    (e.g. np.float32); keep_last=k keeps just the k stages computed last, i.e. steps 0..k-1, for receding-horizon
+    control that only ever acts on the first few steps of a plan.
+"""
+
+import numpy as np
+from MDP import MDP
+from bellman import bellmanBackup
+from solverObservers import notifyObservers
+from solverProfiling import count, nameStats, phase
+
+
+class FiniteHorizonSolution:
+    def __init__(self, V, policy, horizon, state_labels=None, action_labels=None):
+        """
+        Parameters:
+        - V, policy: (k, S) arrays for steps 0..k-1 of the horizon
+        - horizon: Number of steps H the solution was computed for
+        - state_labels, action_labels: Optional labels for the labelled lookups
+        """
+        self.V = V
+        self.policy = policy
+        self.horizon = horizon
+        self.state_labels = None if state_labels is None else list(state_labels)
+        self.action_labels = None if action_labels is None else list(action_labels)
+        self.state_index = None if state_labels is None else {s: i for i, s in enumerate(self.state_labels)}
+
+    @property
+    def stages(self):
+        return self.policy.shape[0]
+
+    def act(self, step, state_idx):
+        """
+        Action index to take in a state at a step of the horizon (0 is the first step).
+        """
+        return int(self.policy[step, state_idx])
+
+    def act_batch(self, step, state_indices):
+        return self.policy[step, state_indices]
+
+    def label_values(self, step=0):
+        """
+        V at a step as a {state: value} dictionary.
+        """
+        return {s: float(value) for s, value in zip(self.state_labels, self.V[step])}
+
+    def label_policy(self, step=0):
+        """
+        The policy at a step as a {state: action} dictionary.
+        """
+        return {s: self.action_labels[int(action)] for s, action in zip(self.state_labels, self.policy[step])}
+
+    def save(self, path):
+        """
+        Save to a .npz file, compressed: time-indexed policies repeat the same actions over many steps.
+        """
+        arrays = {"V": self.V, "policy": self.policy, "horizon": np.int64(self.horizon)}
+        if self.state_labels is not None:
+            arrays["state_labels"] = np.array([str(s) for s in self.state_labels])
+        if self.action_labels is not None:
+            arrays["action_labels"] = np.array([str(a) for a in self.action_labels])
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a solution written by save; labels come back as strings.
+        """
+        with np.load(path) as data:
+            state_labels = data["state_labels"].tolist() if "state_labels" in data.files else None
+            action_labels = data["action_labels"].tolist() if "action_labels" in data.files else None
+            return cls(data["V"], data["policy"], int(data["horizon"]), state_labels, action_labels)
+
+    def __repr__(self):
+        return f"FiniteHorizonSolution(horizon={self.horizon}, stages={self.stages}, states={self.policy.shape[1]})"
+
+
+def backwardInduction(P, R, horizon, gamma=1.0, terminal_values=None, keep_last=None, terminal_mask=None,
+                      value_dtype=np.float64, observers=None, stats=None):
+    """
+    Finite-horizon backward induction over the array form of an MDP (see MDP.P and MDP.R).
+
+    Parameters:
+    - horizon: Number of steps H
+    - gamma: Discount factor per step (1 for the plain sum of rewards)
+    - terminal_values: Optional length-S values collected after the last step (default 0)
+    - keep_last: If given, only keep the k stages computed last (steps 0..k-1)
+    - terminal_mask: Optional boolean mask of terminal states, which collect their best reward on every step left
+    - value_dtype: dtype of the stored values; the backups themselves always run in float64
+    - observers: Called after every stage with the number of stages done and the max change in V (see solverObservers)
+    - stats: Optional solverProfiling.SolverStats recording per-phase timings and counts
+
+    Returns V and policy as (k, S) arrays for steps 0..k-1, k = horizon unless keep_last is given.
+    """
+    nameStats(stats, "backward_induction")
+    if horizon < 1:
+        raise ValueError("The horizon must be at least one step")
+    num_states, num_actions = R.shape
+    stages = horizon if keep_last is None else max(1, min(keep_last, horizon))
+
+    V_stored = np.empty((stages, num_states), dtype=value_dtype)
+    policy_stored = np.empty((stages, num_states), dtype=np.min_scalar_type(max(num_actions - 1, 0)))
+    V = np.zeros(num_states) if terminal_values is None else np.array(terminal_values, dtype=np.float64)
+
+    has_terminal = terminal_mask is not None and np.any(terminal_mask)
+    if has_terminal:
+        best_rewards = R[terminal_mask].max(axis=1)
+        terminal_policy = R[terminal_mask].argmax(axis=1)
+    num_active = num_states - (int(np.count_nonzero(terminal_mask)) if has_terminal else 0)
+
+    for step in range(horizon - 1, -1, -1):
+        with phase(stats, "backup"):
+            new_V, policy = bellmanBackup(P, R, V, gamma)
+            if has_terminal:
+                # a terminal state stays put, collecting its best reward once more
+                new_V[terminal_mask] = best_rewards + gamma * V[terminal_mask]
+                policy[terminal_mask] = terminal_policy
+            delta = np.max(np.abs(new_V - V), initial=0)
+        V = new_V
+        count(stats, "backups", num_active)
+        count(stats, "sweeps")
+
+        if step < stages:
+            V_stored[step] = V
+            policy_stored[step] = policy
+
+        notifyObservers(observers, "Backward Induction", horizon - step, delta, V)
+
+    count(stats, "iterations", horizon)
+    return V_stored, policy_stored
+
+
+def finiteHorizonValueIteration(states, actions, transition_matrix, reward_matrix, horizon, gamma=1.0,
+                                terminal_values=None, keep_last=None, terminal_states=None, value_dtype=np.float64,
+                                observers=None, stats=None):
+    """
+    Backward induction on the dictionary form of an MDP (see MDP.convert_to_dictionary).
+
+    Parameters:
+    - terminal_values: Optional {state: value} dictionary of values collected after the last step
+    - terminal_states: States that end an episode (defaults to the absorbing states, see MDP.terminal_mask)
+    - see backwardInduction for the others
+
+    Returns a FiniteHorizonSolution, e.g. solution.label_policy(0) is the policy for the first step.
+    """
+    nameStats(stats, "backward_induction")
+    with phase(stats, "compile"):
+        mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrix, gamma,
+                                  terminal_states=terminal_states)
+        if terminal_values is not None:
+            terminal_values = np.array([terminal_values.get(state, 0.0) for state in mdp.state_labels])
+
+    V, policy = backwardInduction(mdp.P, mdp.R, horizon, gamma, terminal_values, keep_last, mdp.terminal_mask,
+                                  value_dtype, observers, stats)
+    return FiniteHorizonSolution(V, policy, horizon, mdp.state_labels, mdp.action_labels)
@@ -0,0 +1,203 @@
+"""
+Streaming Model Loader
+
+    builds a sparse MDP from transition and reward records exported one per line, without ever holding the
+    nested states x actions x states list. records are read in chunks; each chunk is turned into small integer
+    and float arrays of (state, action, next state, probability), so memory grows with the number of nonzero
+    transitions rather than with the size of the file or of the dense tensor.
+
+    record formats (picked from the file extension, or given explicitly):
+        .csv:   state,action,next_state,probability  and  state,action,reward  (a header line is optional)
+        .jsonl: {"state": ..., "action": ..., "next_state": ..., "probability": ...}
+                {"state": ..., "action": ..., "reward": ...}
+
+    malformed records (wrong number of fields, unparsable or out-of-range numbers, labels outside a given
+    state/action list) are skipped and reported with their line number. after loading, every (state, action)
+    row must sum to 1 within a tolerance; rows that don't are reported as well.
+"""
+
+import csv
+import json
+import numpy as np
+import scipy.sparse as sp
+from MDP import MDP
+
+TRANSITION_FIELDS = ("state", "action", "next_state", "probability")
+REWARD_FIELDS = ("state", "action", "reward")
+
+# at most this many malformed records / bad rows are listed in the report (all of them are counted)
+MAX_REPORTED = 100
+
+
+class _LabelIndex:
+    """Assigns integer indices to labels as they are first seen, or looks them up in a fixed label list."""
+
+    def __init__(self, labels=None):
+        self.fixed = labels is not None
+        self.labels = list(labels) if labels is not None else []
+        self.index = {label: i for i, label in enumerate(self.labels)}
+
+    def __call__(self, label):
+        if label not in self.index:
+            if self.fixed:
+                raise KeyError(label)
+            self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return self.index[label]
+
+
+def _records(path, fields, format):
+    """Yield (line number, tuple of field values or None when the line can't be split into them)."""
+    format = format or ("csv" if path.endswith(".csv") else "jsonl")
+
+    with open(path, newline="") as file:
+        if format == "csv":
+            for line_number, row in enumerate(csv.reader(file), start=1):
+                if line_number == 1 and tuple(field.strip() for field in row) == fields:
+                    continue
+                if row:
+                    yield line_number, tuple(row) if len(row) == len(fields) else None
+        elif format == "jsonl":
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    yield line_number, tuple(record[field] for field in fields)
+                except (ValueError, KeyError, TypeError):
+                    yield line_number, None
+        else:
+            raise ValueError(f"Unknown record format {format!r}")
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def loadRecords(transitions_path, rewards_path=None, states=None, actions=None, discount_factor=1.0,
+                format=None, chunk_size=100_000, tolerance=1e-6, strict=False):
+    """
+    Build a sparse MDP from transition records and (optionally) reward records.
+
+    Parameters:
+    - transitions_path: File of (state, action, next_state, probability) records
+    - rewards_path: Optional file of (state, action, reward) records; missing rewards are 0
+    - states, actions: Optional label lists fixing the index order; records with other labels are malformed.
+                       Without them labels are indexed in order of first appearance
+    - discount_factor: Discount factor stored on the MDP
+    - format: "csv" or "jsonl" (defaults to the file extension)
+    - chunk_size: Number of records parsed into arrays at a time
+    - tolerance: Allowed deviation of each (state, action) row sum from 1
+    - strict: If True, raise ValueError when anything is reported instead of returning the report
+
+    Returns:
+    - mdp: MDP with a CSR transition matrix (see MDP.__init__)
+    - report: dictionary with the number of "transitions" and "rewards" records used, "malformed" records as
+              (file, line, reason), "row_sum_errors" as (state, action, row sum) and "missing_rows", the number
+              of (state, action) pairs without any transition record. lists are capped at MAX_REPORTED entries;
+              "malformed_count" and "row_sum_error_count" hold the full counts
+    """
+    state_index = _LabelIndex(states)
+    action_index = _LabelIndex(actions)
+    malformed = []
+    malformed_count = 0
+
+    def reject(path, line_number, reason):
+        nonlocal malformed_count
+        malformed_count += 1
+        if len(malformed) < MAX_REPORTED:
+            malformed.append((path, line_number, reason))
+
+    def parse_chunk(path, chunk, fields):
+        # one (state, action, [next state,] value) tuple of arrays per chunk
+        value_field = fields[-1]
+        columns = []
+        for line_number, record in chunk:
+            if record is None:
+                reject(path, line_number, f"expected fields {', '.join(fields)}")
+                continue
+            try:
+                value = float(record[-1])
+            except (TypeError, ValueError):
+                reject(path, line_number, f"{value_field} {record[-1]!r} is not a number")
+                continue
+            if not np.isfinite(value) or (value_field == "probability" and not 0 <= value <= 1 + tolerance):
+                reject(path, line_number, f"{value_field} {value!r} is out of range")
+                continue
+            try:
+                indices = [state_index(record[0]), action_index(record[1])]
+                if len(record) == 4:
+                    indices.append(state_index(record[2]))
+            except KeyError as error:
+                reject(path, line_number, f"unknown label {error.args[0]!r}")
+                continue
+            columns.append((*indices, value))
+
+        if not columns:
+            return None
+        *index_columns, values = zip(*columns)
+        return [np.array(column, dtype=np.int64) for column in index_columns] + [np.array(values)]
+
+    def parse_file(path, fields):
+        chunks = []
+        for chunk in _chunks(_records(path, fields, format), chunk_size):
+            arrays = parse_chunk(path, chunk, fields)
+            if arrays is not None:
+                chunks.append(arrays)
+        return chunks
+
+    transition_chunks = parse_file(transitions_path, TRANSITION_FIELDS)
+    reward_chunks = parse_file(rewards_path, REWARD_FIELDS) if rewards_path is not None else []
+
+    num_states, num_actions = len(state_index.labels), len(action_index.labels)
+    num_rows = num_states * num_actions
+
+    def concatenate(chunks, width):
+        if not chunks:
+            return [np.zeros(0, dtype=np.int64)] * (width - 1) + [np.zeros(0)]
+        return [np.concatenate(column) for column in zip(*chunks)]
+
+    # duplicate (state, action, next state) records are summed, as in a COO matrix
+    s, a, s_prime, probabilities = concatenate(transition_chunks, 4)
+    num_transitions = probabilities.size
+    del transition_chunks
+    P = sp.csr_matrix((probabilities, (s * num_actions + a, s_prime)), shape=(num_rows, num_states))
+    del s, a, s_prime, probabilities
+
+    R = np.zeros((num_states, num_actions))
+    s, a, rewards = concatenate(reward_chunks, 3)
+    R[s, a] = rewards
+
+    # every (state, action) row has to be a probability distribution
+    row_sums = np.asarray(P.sum(axis=1)).ravel()
+    row_lengths = np.diff(P.indptr)
+    bad_rows = np.flatnonzero((np.abs(row_sums - 1) > tolerance) & (row_lengths > 0))
+    row_sum_errors = [(state_index.labels[row // num_actions], action_index.labels[row % num_actions],
+                       float(row_sums[row])) for row in bad_rows[:MAX_REPORTED].tolist()]
+
+    report = {
+        "transitions": int(num_transitions),
+        "rewards": int(rewards.size),
+        "malformed": malformed,
+        "malformed_count": malformed_count,
+        "row_sum_errors": row_sum_errors,
+        "row_sum_error_count": int(bad_rows.size),
+        "missing_rows": int(np.count_nonzero(row_lengths == 0))
+    }
+
+    if strict and (malformed_count or bad_rows.size or report["missing_rows"]):
+        raise ValueError(f"Invalid model records: {malformed_count} malformed records, {bad_rows.size} rows not "
+                         f"summing to 1, {report['missing_rows']} (state, action) pairs without transitions")
+
+    # rows already reported above would fail validation; the caller decides what to do about them
+    mdp = MDP(state_index.labels, action_index.labels, P, R, discount_factor, validate=False, tolerance=tolerance)
+    if not (bad_rows.size or report["missing_rows"]):
+        mdp.validate(tolerance)
+    return mdp, report
@@ -0,0 +1,133 @@
+"""
+Model Validation
+
+    checks run on every MDP before any solver sees it, each one a vectorized pass over P and R so they stay
+    cheap at 10^5 states with a sparse P (O(nonzeros) for CSR, O(S*A*S) for dense).
+
+    - labels: states and actions must come in a fixed order (lists, tuples, ranges, arrays, dict keys) and be
+      unique. sets are rejected, since their iteration order depends on hashing and can change between runs,
+      which would silently map rows of the matrices to different labels.
+    - shapes: P must be (S, A, S) or, in CSR form, (S*A, S), and R must be (S, A).
+    - values: no negative, NaN or infinite probabilities and no NaN or +inf rewards. a reward of -inf marks an
+      action the state doesn't offer (see MDP.from_dictionary), and every state must offer at least one.
+    - rows: every (state, action) row of P sums to 1 within a tolerance, or is rescaled to do so with
+      normalize=True.
+
+    it also identifies
+    - absorbing states: every action leads back to the state itself with probability 1. these are the states
+      MDP.terminal_mask treats as terminal unless terminal states are declared explicitly
+    - zero-reward absorbing states: absorbing states whose rewards are 0 for every action they offer, so nothing
+      more can happen there and their value is 0
+"""
+
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+
+# at most this many offending (state, action) pairs are named in an error message
+MAX_LISTED = 5
+
+
+def orderedLabels(labels, kind):
+    """
+    The labels as a list, rejecting unordered collections and duplicates.
+    """
+    if isinstance(labels, (set, frozenset)):
+        raise TypeError(f"{kind} must be an ordered sequence such as a list, not a {type(labels).__name__}: "
+                        f"the order of a {type(labels).__name__} can change between runs, which would silently "
+                        f"change which rows of the transition and reward matrices belong to which {kind[:-1]}")
+    labels = list(labels)
+    if len(set(labels)) != len(labels):
+        duplicates = sorted(repr(label) for label, count in Counter(labels).items() if count > 1)
+        raise ValueError(f"{kind} contain duplicates: {', '.join(duplicates)}")
+    return labels
+
+
+def _describe(rows, state_labels, action_labels):
+    num_actions = len(action_labels)
+    pairs = [f"({state_labels[row // num_actions]!r}, {action_labels[row % num_actions]!r})"
+             for row in rows[:MAX_LISTED].tolist()]
+    more = f" and {len(rows) - MAX_LISTED} more" if len(rows) > MAX_LISTED else ""
+    return ", ".join(pairs) + more
+
+
+def validateModel(P, R, state_labels, action_labels, tolerance=1e-6, normalize=False):
+    """
+    Check P and R against the labels (see above), raising ValueError on the first failed check.
+
+    Parameters:
+    - P: Dense (S, A, S) array or CSR (S*A, S) matrix of float64 transition probabilities
+    - R: (S, A) float64 reward array
+    - state_labels, action_labels: Label lists (see orderedLabels)
+    - tolerance: Allowed deviation of each row sum from 1
+    - normalize: If True, rescale rows that are off by more than the tolerance instead of failing
+
+    Returns:
+    - P: P itself, or a rescaled copy when normalize=True and some rows were off
+    - report: dictionary with the "normalized_rows" count and the integer indices of the "absorbing" and
+              "zero_reward_absorbing" states
+    """
+    num_states, num_actions = len(state_labels), len(action_labels)
+    num_rows = num_states * num_actions
+
+    expected_shape = (num_rows, num_states) if sp.issparse(P) else (num_states, num_actions, num_states)
+    if P.shape != expected_shape:
+        raise ValueError(f"Transition matrix has shape {P.shape}, expected {expected_shape} for "
+                         f"{num_states} states and {num_actions} actions")
+    if R.shape != (num_states, num_actions):
+        raise ValueError(f"Reward matrix has shape {R.shape}, expected {(num_states, num_actions)}")
+
+    values = P.data if sp.issparse(P) else P
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Transition matrix contains NaN or infinite probabilities")
+    offered = ~np.isneginf(R)
+    if not np.all(np.isfinite(R[offered])):
+        raise ValueError("Reward matrix contains NaN or +inf rewards")
+    no_actions = np.flatnonzero(~offered.any(axis=1))
+    if no_actions.size:
+        names = ", ".join(repr(state_labels[i]) for i in no_actions[:MAX_LISTED].tolist())
+        raise ValueError(f"States offer no action (every reward is -inf): {names}")
+
+    if sp.issparse(P):
+        row_ids = np.repeat(np.arange(num_rows), np.diff(P.indptr))
+        negative_rows = np.unique(row_ids[P.data < 0])
+        row_sums = np.asarray(P.sum(axis=1)).ravel()
+    else:
+        rows = P.reshape(num_rows, num_states)
+        negative_rows = np.flatnonzero((rows < 0).any(axis=1))
+        row_sums = rows.sum(axis=1)
+
+    if negative_rows.size:
+        raise ValueError(f"Negative transition probabilities in {_describe(negative_rows, state_labels, action_labels)}")
+
+    bad_rows = np.flatnonzero(np.abs(row_sums - 1) > tolerance)
+    if bad_rows.size and (not normalize or np.any(row_sums[bad_rows] == 0)):
+        raise ValueError(f"Transition probabilities do not sum to 1 (within {tolerance}) for "
+                         f"{_describe(bad_rows, state_labels, action_labels)}")
+    if bad_rows.size:
+        scale = np.ones(num_rows)
+        scale[bad_rows] = 1 / row_sums[bad_rows]
+        P = sp.csr_matrix(sp.diags(scale) @ P) if sp.issparse(P) else P * scale.reshape(num_states, num_actions, 1)
+
+    absorbing = absorbingStates(P, num_states, num_actions, tolerance)
+    zero_reward = absorbing & np.all((R == 0) | ~offered, axis=1)
+
+    report = {
+        "normalized_rows": int(bad_rows.size),
+        "absorbing": np.flatnonzero(absorbing),
+        "zero_reward_absorbing": np.flatnonzero(zero_reward)
+    }
+    return P, report
+
+
+def absorbingStates(P, num_states, num_actions, tolerance=1e-6):
+    """
+    Boolean mask of the states that every action leads back to with probability 1.
+    """
+    # probability of staying put under each action
+    if sp.issparse(P):
+        rows = np.arange(num_states * num_actions)
+        self_loops = np.asarray(P[rows, rows // num_actions]).ravel()
+    else:
+        self_loops = P[np.arange(num_states), :, np.arange(num_states)].ravel()
+    return np.all(np.abs(self_loops.reshape(num_states, num_actions) - 1) <= tolerance, axis=1)
@@ -2,8 +2,31 @@
 start with an intial policy and iteratiuvely update the policy to find the best one
 1) Policy Evaluation: Evaluate the given policy
 2) Policy Improvment: refind or find a better policy
+
+The dictionary-based functions compile their inputs into the P and R arrays of MDP and delegate to the
+array versions (evaluatePolicy, improvePolicy, batchedPolicyIteration), which work on dense or sparse P.
 """
 
+import time
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from MDP import MDP
+from bellman import bellmanBackup, policyModel, qTable, stoppingThreshold, terminalValues
+from solveCache import cachedSolution, resolveCache, solveKey, storeSolution
+from solverObservers import notifyObservers
+from solverProfiling import count, nameStats, phase
+from valueHistory import recordHistory
+from warmStart import initialPolicy, initialValues, iterationsSaved
+
+# largest state space for which the "direct" evaluation method uses a dense LU factorisation
+DIRECT_SOLVE_MAX_STATES = 2000
+
+def _compile(states, transition_matrix, reward_matrix):
+    # the evaluation dictionaries carry no separate actions argument, so take each state's actions from its transitions
+    actions = {state: list(transition_matrix[state]) for state in states}
+    return MDP.from_dictionary(states, actions, transition_matrix, reward_matrix)
+
 """
     Policy evaluation
     estiamtes the state-value function for a given policy in a MDP. 
@@ -28,45 +51,146 @@ pseudo-code:
     Return V
 """
 
-def PolicyEvaluation(policy, transition_matrix, reward_matrix, gamma, theta, states):
+"""
+    Exact policy evaluation
+    the Bellman expectation equation for a fixed policy is linear, V = R_pi + gamma * P_pi @ V, so V can be
+    found with one linear solve of (I - gamma * P_pi) V = R_pi instead of sweeping until convergence.
+    requires gamma < 1 (or a policy that is certain to reach an absorbing state with zero reward).
+
+    methods:
+        "sweep":    repeated expectation backups until the change is below theta (as above)
+        "lu":       dense LU factorisation, exact up to round-off
+        "gmres":    sparse GMRES, iterated until the residual is within theta*(1-gamma)
+        "bicgstab": sparse BiCGSTAB, same tolerance as gmres
+        "direct":   "lu" for up to DIRECT_SOLVE_MAX_STATES states, "bicgstab" above that
+"""
 
-    # intialise V with arbitrary value
-    V = {state: 0 for state in states}
+def _solveLinearSystem(P_pi, R_pi, gamma, threshold, method, V):
+    num_states = R_pi.shape[0]
+    iterations = [0]
 
-    # until convergence
-    while True:
-        new_V = V.copy()
+    def count_iteration(_):
+        iterations[0] += 1
 
-        #update each state's state-value function based on bellman expectation equation
-        for state in states:
-            action = policy[state]
+    if method == "direct":
+        method = "lu" if num_states <= DIRECT_SOLVE_MAX_STATES else "bicgstab"
 
-            #intialise state's value function and delta to 0
-            delta = 0
-            state_value = 0
+    if method == "lu":
+        P_pi = P_pi.toarray() if sp.issparse(P_pi) else P_pi
+        return np.linalg.solve(np.eye(num_states) - gamma * P_pi, R_pi), 1
+
+    A = sp.identity(num_states, format="csr") - gamma * sp.csr_matrix(P_pi)
+
+    # a residual of threshold*(1-gamma) bounds the error in V by threshold
+    if method == "gmres":
+        V, info = spla.gmres(A, R_pi, x0=V, rtol=0.0, atol=threshold * (1 - gamma),
+                             callback=count_iteration, callback_type="pr_norm")
+    elif method == "bicgstab":
+        V, info = spla.bicgstab(A, R_pi, x0=V, rtol=0.0, atol=threshold * (1 - gamma), callback=count_iteration)
+    else:
+        raise ValueError(f"Unknown policy evaluation method {method!r}")
+
+    if info != 0:
+        raise RuntimeError(f"{method} policy evaluation did not converge (info={info})")
+    return V, iterations[0]
+
+def evaluatePolicy(P, R, policy, gamma, theta, method="sweep", V=None, max_sweeps=None, stopping="delta",
+                   return_report=False, terminal_mask=None, stats=None):
+    """
+    Policy evaluation over the array form of an MDP, policy being a length-S array of action indices.
+
+    Parameters:
+    - method: "sweep", "lu", "gmres", "bicgstab" or "direct" (see above)
+    - V: Optional starting value array (sweeps start from it, iterative solvers use it as their initial guess)
+    - max_sweeps: For method="sweep", stop after this many sweeps even if not converged
+    - stopping: "delta" stops once the max change over all states is below theta, "epsilon" once it is below
+                theta*(1-gamma)/(2*gamma), which makes the greedy policy theta-optimal
+    - return_report: If True, also return a convergence report
+    - terminal_mask: Optional boolean mask of terminal states; their values are pinned (see bellman.terminalValues)
+                     and only the other states are evaluated
+    - stats: Optional solverProfiling.SolverStats counting evaluation sweeps and backups (callers time the phase)
+
+    Returns:
+    - V, or (V, report) where report holds "sweeps", "residual" (final max-norm Bellman residual),
+      "converged" and "time" (wall time in seconds)
+    """
+    start_time = time.perf_counter()
+    threshold = stoppingThreshold(theta, gamma, stopping)
+
+    # restrict the model to the policy's action in each state
+    P_pi, R_pi = policyModel(P, R, policy)
 
-            # compute the state's expected value given the policy's action
-            for next_state in states:
-                transition_prob = transition_matrix[state][action][next_state] 
-                reward = reward_matrix[state][action]
+    # intialise V with arbitrary value
+    V = np.zeros(R.shape[0]) if V is None else np.asarray(V, dtype=np.float64)
+
+    has_terminal = terminal_mask is not None and np.any(terminal_mask)
+    if has_terminal:
+        # terminal values are fixed, so fold their share into the rewards and evaluate the other states only
+        full_V = V.copy()
+        full_V[terminal_mask] = terminalValues(R, terminal_mask, gamma)
+        active, terminal = np.flatnonzero(~terminal_mask), np.flatnonzero(terminal_mask)
+        P_pi = P_pi[active]
+        R_pi = R_pi[active] + gamma * (P_pi[:, terminal] @ full_V[terminal])
+        P_pi = P_pi[:, active]
+        V = full_V[active]
+
+    if method != "sweep":
+        V, sweeps = _solveLinearSystem(P_pi, R_pi, gamma, threshold, method, V)
+        delta = np.max(np.abs(R_pi + gamma * (P_pi @ V) - V), initial=0)
+    else:
+        sweeps = 0
 
-                #update the state's value function based off this succesor state
-                state_value += transition_prob * (reward + gamma*V[next_state])
-            
-            #Assign state's value to new value function
-            new_V[state] = state_value
+        # until convergence, checking the largest change over every state in the sweep
+        while True:
+            #update every state's value function based on bellman expectation equation
+            new_V = R_pi + gamma * (P_pi @ V)
+            delta = np.max(np.abs(new_V - V), initial=0)
+            sweeps += 1
 
-            #update delta 
-            delta = max(delta, abs(new_V[state] - V[state]))
+            #update Value function with the new state values for next iteration
+            V = new_V
 
-        #check convergence
-        if delta < theta:
-            break
-        
-        #update Value function with the new state values for next iteration
-        V = new_V
-    
-    return V
+            #check convergence
+            if delta < threshold or sweeps == max_sweeps:
+                break
+
+    if method == "sweep":
+        count(stats, "sweeps", sweeps)
+        count(stats, "backups", sweeps * R_pi.shape[0])
+    else:
+        count(stats, "linear_solves")
+
+    if has_terminal:
+        full_V[active] = V
+        V = full_V
+
+    if not return_report:
+        return V
+
+    report = {
+        "sweeps": sweeps,
+        "residual": float(delta),
+        "converged": bool(delta < threshold) if method == "sweep" else True,
+        "time": time.perf_counter() - start_time
+    }
+    return V, report
+
+def PolicyEvaluation(policy, transition_matrix, reward_matrix, gamma, theta, states, method="sweep", max_sweeps=None,
+                     stopping="delta", return_report=False, stats=None):
+    nameStats(stats, "policy_evaluation")
+    with phase(stats, "compile"):
+        mdp = _compile(states, transition_matrix, reward_matrix)
+        policy = np.array([mdp.action_index[policy[state]] for state in mdp.state_labels])
+
+    with phase(stats, "evaluation"):
+        result = evaluatePolicy(mdp.P, mdp.R, policy, gamma, theta, method, max_sweeps=max_sweeps, stopping=stopping,
+                                return_report=return_report, stats=stats)
+
+    with phase(stats, "extraction"):
+        if return_report:
+            V, report = result
+            return mdp.label_values(V), report
+        return mdp.label_values(result)
 
 """
 Policy Improvement
@@ -93,36 +217,37 @@ Policy Improvement
         Return new_policy
 """
 
-def PolicyImprovement(V, transition_matrix, reward_matrix, actions, gamma, states):
-    new_policy={}
-
-    # iterate through each estate to update its policy base on action
-    for state in states:
-
-        # Initialise values for best action and best value for state s
-        best_action = None
-        best_value = float("-inf")
-
-        # compute through each action to find the one with greatest expected return
-        for action in actions[state]:
-            action_value = 0
-
-            # calculate the expected value of this action over all successor states
-            for next_state in states: 
-                transition_prob = transition_matrix[state][action][next_state]
-                reward = reward_matrix[state][action]
-                action_value += transition_prob * (reward + (gamma * V[next_state]))
-
-            # Update best action if this action's value is higher 
-            if action_value > best_value:
-                best_value = action_value
-                best_action = action
-
-        # update improved/refined action to policy for this state
-        new_policy[state] = best_action
-
+def improvePolicy(P, R, V, gamma):
+    """
+    Greedy policy (array of action indices) with respect to the value array V.
+    """
+    _, new_policy = bellmanBackup(P, R, V, gamma)
     return new_policy
 
+def PolicyImprovement(V, transition_matrix, reward_matrix, actions, gamma, states, stats=None, return_q=False):
+    """
+    With return_q=True, also returns the (S, A) Q-table the greedy policy was taken from (rows follow states,
+    columns the actions in order of first appearance, -inf where a state doesn't offer one; see MDP.from_dictionary).
+    """
+    nameStats(stats, "policy_improvement")
+    with phase(stats, "compile"):
+        mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrix, gamma)
+        V = np.array([V[state] for state in mdp.state_labels], dtype=np.float64)
+
+    with phase(stats, "improvement"):
+        if return_q:
+            # argmax picks the first maximising action, as improvePolicy does
+            Q = qTable(mdp.P, mdp.R, V, gamma)
+            new_policy = Q.argmax(axis=1)
+        else:
+            new_policy = improvePolicy(mdp.P, mdp.R, V, gamma)
+    count(stats, "backups", mdp.num_states)
+
+    with phase(stats, "extraction"):
+        if return_q:
+            return mdp.label_policy(new_policy), Q
+        return mdp.label_policy(new_policy)
+
 """
 Policy Iteration
     combining the two to determine optimal policy and correlated state-value function
@@ -142,39 +267,218 @@ Policy Iteration
                 Break
             Update the current policy to new_policy
         Return the final state-value function V and the optimal policy
+
+    modified policy iteration (sweeps=k)
+        evaluation is cut short after k sweeps, continuing from the previous V instead of from 0.
+        since V is then only approximate, the loop also requires the Bellman residual to be below theta before stopping.
+
+    budgets
+        with a solveBudget.SolveBudget a round only starts if its evaluation sweeps and improvement backup fit in the
+        budget, evaluation being cut short to the sweeps that are left, and the loop stops once it runs out. it
+        returns the last V and the greedy policy with respect to it; the improvement step's backup gives the
+        residual behind the budget's suboptimality bound.
+
+    warm starts
+        an initial policy replaces the first-action policy. an initial V is used as the starting point of the first
+        evaluation and, without an initial policy, its greedy policy becomes the initial policy. every later
+        evaluation starts from the previous round's V, which is close to the new policy's values once the policy
+        only changes in a few states.
 """
 
-def policyIteration(states, actions, transition_matrix, reward_matrix, gamma=0.9, theta=1e-3, track_history=False):
-    policy = {state: actions[state][0] for state in states}
+def _evaluationStep(P, R, policy, V, gamma, theta, evaluation, sweeps, stopping, terminal_mask, stats):
+    # returns (V, report); the report's sweep count is charged to a budget
+    if sweeps is None:
+        return evaluatePolicy(P, R, policy, gamma, theta, evaluation, V=V, stopping=stopping, return_report=True,
+                              terminal_mask=terminal_mask, stats=stats)
+    return evaluatePolicy(P, R, policy, gamma, theta, "sweep", V=V, max_sweeps=sweeps, stopping=stopping,
+                          return_report=True, terminal_mask=terminal_mask, stats=stats)
+
+def _hasConverged(policy, new_policy, V, new_V, threshold, sweeps):
+    if not np.array_equal(new_policy, policy):
+        return False
+    # after truncated evaluation a stable policy is not enough, V itself must have settled
+    return sweeps is None or np.max(np.abs(new_V - V)) < threshold
+
+def batchedPolicyIteration(P, R, gamma=0.9, theta=1e-3, track_history=False, evaluation="sweep", sweeps=None,
+                           stopping="delta", observers=None, initial_policy=None, initial_values=None,
+                           terminal_mask=None, stats=None, budget=None, return_iterations=False):
+    """
+    Policy iteration over the array form of an MDP (see MDP.P and MDP.R).
+
+    Parameters:
+    - evaluation: Policy evaluation method passed to evaluatePolicy ("sweep", "lu", "gmres", "bicgstab", "direct")
+    - sweeps: If given, run modified policy iteration with this many evaluation sweeps per round
+    - stopping: Stopping rule for evaluation, "delta" or "epsilon" (see bellman.stoppingThreshold)
+    - observers: Callables notified after every round with the max change in V (see solverObservers)
+    - initial_policy, initial_values: Optional warm start (see above)
+    - terminal_mask: Optional boolean mask of terminal states, which keep their pinned values and best-reward action
+    - stats: Optional solverProfiling.SolverStats recording per-phase timings and counts
+    - budget: Optional solveBudget.SolveBudget stopping the rounds early (see above)
+    - return_iterations: Also return the value history (None without track_history) and the number of rounds
+
+    Returns V as a length-S array and the policy as a length-S array of action indices, followed by the value
+    history and the number of rounds when track_history is set or return_iterations is True.
+    """
+    nameStats(stats, "policy_iteration")
+    if budget is not None:
+        budget.start()
+    num_active = R.shape[0] if terminal_mask is None else int(np.count_nonzero(~terminal_mask))
+    V = np.zeros(R.shape[0]) if initial_values is None else np.array(initial_values, dtype=np.float64)
+    if initial_policy is not None:
+        policy = np.array(initial_policy, dtype=np.intp)
+    elif initial_values is not None:
+        policy = improvePolicy(P, R, V, gamma)
+    else:
+        # the first action each state offers (see MDP.action_mask)
+        policy = (~np.isneginf(R)).argmax(axis=1)
+    if terminal_mask is not None:
+        # the greedy action of a state that every action leaves in place is its best-reward action
+        policy[terminal_mask] = R[terminal_mask].argmax(axis=1)
+    threshold = stoppingThreshold(theta, gamma, stopping)
     iteration_count = 0
-    value_history = [] if track_history else None
+    value_history = recordHistory(track_history, R.shape[0])
+    # sweep evaluations are charged per sweep, linear solves are not
+    sweep_evaluation = evaluation == "sweep" or sweeps is not None
+    new_V = None
 
     while True:
+        round_sweeps = sweeps
+        if budget is not None:
+            # a round needs at least one evaluation sweep and the improvement backup
+            if not budget.allows((2 if sweep_evaluation else 1) * num_active):
+                converged = False
+                if new_V is None:
+                    # stopped before the first round: the bound's residual needs one backup of the starting V
+                    new_V, policy = bellmanBackup(P, R, V, gamma)
+                    if terminal_mask is not None:
+                        policy[terminal_mask] = R[terminal_mask].argmax(axis=1)
+                break
+            if sweep_evaluation and budget.remaining() is not None:
+                affordable = budget.remaining() // num_active - 1
+                round_sweeps = affordable if sweeps is None else min(sweeps, affordable)
+
         iteration_count += 1
 
         #compute the state value function for current policy
-        V = PolicyEvaluation(policy, transition_matrix, reward_matrix, gamma, theta, states)
-        
-        if track_history:
-            value_history.append(V.copy())
-        
-        print(f"Policy Iteration {iteration_count}: Value Function after Policy Evaluation: {V}")
+        previous_V = V
+        with phase(stats, "evaluation"):
+            V, evaluation_report = _evaluationStep(P, R, policy, V, gamma, theta, evaluation, round_sweeps, stopping,
+                                                   terminal_mask, stats)
 
-        #improve policy given its current state value function
-        new_policy = PolicyImprovement(V, transition_matrix, reward_matrix, actions, gamma, states)
+        if value_history is not None:
+            with phase(stats, "history"):
+                value_history.record(iteration_count, V)
+
+        notifyObservers(observers, "Policy Iteration", iteration_count, np.max(np.abs(V - previous_V)), V)
 
-        print(f"Policy Iteration {iteration_count}: Policy after Improvement: {new_policy} \n")
+        #improve policy given its current state value function
+        with phase(stats, "improvement"):
+            new_V, new_policy = bellmanBackup(P, R, V, gamma)
+        count(stats, "backups", R.shape[0])
+        count(stats, "iterations")
+
+        # Check convergence / optimal policy; an evaluation the budget cut short needs V to have settled as well
+        converged = _hasConverged(policy, new_policy, V, new_V, threshold,
+                                  sweeps if evaluation_report["converged"] else round_sweeps)
+        if converged:
+            break
 
-        # Check convergence / optimal policy
-        if new_policy == policy:
+        # sweeps are backups of every active state
+        evaluation_sweeps = evaluation_report["sweeps"] if sweep_evaluation else 0
+        if budget is not None and budget.spend((evaluation_sweeps + 1) * num_active):
+            # return the greedy policy of this round's V, which the improvement step already found
+            policy = new_policy
             break
 
         #update improved policy
         policy = new_policy
 
-    if track_history:
-        return V, policy, value_history, iteration_count
-    else:
-        return V, policy
-
+    if budget is not None:
+        changes = np.abs(new_V - V)
+        if terminal_mask is not None:
+            changes[terminal_mask] = 0
+        budget.finish(np.max(changes, initial=0), gamma, converged)
 
+    if value_history is not None:
+        with phase(stats, "history"):
+            value_history.finish(iteration_count, V)
+    if value_history is not None or return_iterations:
+        return V, policy, value_history, iteration_count
+    return V, policy
+
+def policyIteration(states, actions, transition_matrix, reward_matrix, gamma=0.9, theta=1e-3, track_history=False,
+                    evaluation="sweep", sweeps=None, stopping="delta", observers=None, initial_policy=None,
+                    initial_values=None, return_report=False, terminal_states=None, cache=None, stats=None,
+                    budget=None, return_q=False, cold_iterations=None):
+    """
+    Policy iteration on the dictionary form of an MDP (see MDP.convert_to_dictionary), starting from the first
+    available action in every state. The solver prints nothing itself; pass observers to follow progress.
+
+    initial_policy ({state: action}) and initial_values ({state: value}) warm-start the solver; either may also be
+    the path of a saveSolution file (see warmStart). With return_report=True a report with the number of
+    "iterations" (rounds) is returned as well. Its "iterations_saved" by a warm start needs the round count of a
+    cold solve: pass it as cold_iterations, or cold_iterations=True to run that cold solve (costing more than the
+    warm start saves); otherwise, and always with a budget, it is None. terminal_states are pinned rather than
+    evaluated (defaults to the absorbing states, see MDP.terminal_mask).
+
+    cache (a SolveCache, or True for the default one) returns an identical earlier solve without iterating (see
+    solveCache); runs with observers, a warm start, a budget or a custom ValueHistory are never cached. stats (a
+    solverProfiling.SolverStats) records per-phase timings and counts. budget (a solveBudget.SolveBudget) stops the
+    rounds once it runs out and receives the returned policy's suboptimality bound. return_q=True also returns the
+    (S, A) Q-table of the returned V (see bellman.qTable), after the history and before the report; rows follow
+    states and columns the model's actions, as in PolicyImprovement (see compiledPolicy for fast lookups).
+    """
+    nameStats(stats, "policy_iteration")
+    # compile the dictionaries into P and R arrays once for every evaluation and improvement step
+    with phase(stats, "compile"):
+        mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrix, gamma,
+                                  terminal_states=terminal_states)
+
+    value_history = recordHistory(track_history, mdp.num_states, mdp.state_labels)
+    policy0 = initialPolicy(mdp, initial_policy)
+    V0 = initialValues(mdp, initial_values)
+    warm_start = policy0 is not None or V0 is not None
+
+    cache = resolveCache(cache)
+    if observers or warm_start or budget is not None or not isinstance(track_history, bool):
+        cache = None
+    if cache is not None:
+        key = solveKey(mdp.P, mdp.R, gamma, theta, "policy_iteration", mdp.terminal_mask, evaluation=evaluation,
+                       sweeps=sweeps, stopping=stopping)
+        cached = cachedSolution(cache, key, mdp, track_history)
+        if cached is not None:
+            count(stats, "cache_hits")
+            V, policy, value_history, iterations = cached
+            with phase(stats, "extraction"):
+                returns = (mdp.label_values(V), mdp.label_policy(policy))
+                returns += (value_history, iterations) if value_history is not None else ()
+                returns += (qTable(mdp.P, mdp.R, V, gamma, mdp.terminal_mask),) if return_q else ()
+            if not return_report:
+                return returns
+            return returns + ({"iterations": iterations, "warm_start": False, "iterations_saved": 0, "cached": True},)
+
+    # from_dictionary keeps the order of first appearance of the actions, so with every state offering the same
+    # actions the first one each state offers is actions[state][0]
+    result = batchedPolicyIteration(mdp.P, mdp.R, gamma, theta, value_history, evaluation, sweeps, stopping,
+                                    observers, policy0, V0, mdp.terminal_mask, stats, budget, return_iterations=True)
+    iterations = result[3]
+    if cache is not None:
+        storeSolution(cache, key, result[0], result[1], iterations, value_history)
+
+    with phase(stats, "extraction"):
+        V = mdp.label_values(result[0])
+        policy = mdp.label_policy(result[1])
+        returns = (V, policy, value_history, iterations) if value_history is not None else (V, policy)
+        returns += (qTable(mdp.P, mdp.R, result[0], gamma, mdp.terminal_mask),) if return_q else ()
+
+    if not return_report:
+        return returns
+
+    iterations_saved = iterationsSaved(warm_start, iterations, cold_iterations, budget,
+                                       lambda: batchedPolicyIteration(mdp.P, mdp.R, gamma, theta, False, evaluation,
+                                                                      sweeps, stopping, terminal_mask=mdp.terminal_mask,
+                                                                      return_iterations=True)[3])
+
+    report = {"iterations": iterations, "warm_start": warm_start, "iterations_saved": iterations_saved,
+              "cached": False}
+    return returns + (report,)
@@ -0,0 +1,181 @@
+"""
+Batched Monte Carlo Rollouts
+
+    simulates many episodes of a fixed policy in lockstep. every step draws one uniform number per
+    active episode and turns it into a next state with a TransitionSampler over the nonzero successors
+    (alias tables by default, or cumulative distribution rows searched with searchsorted), so a step
+    is a few numpy operations over the active episodes rather than a np.random.choice per episode.
+
+    parallelSimulateEpisodes shards the episodes over a process pool. the sampler tables and rewards of the
+    policy's Markov chain are placed in shared memory once, and every worker attaches to them instead of
+    receiving its own pickled copy.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.stats import norm
+from bellman import policyModel
+from transitionSampler import TransitionSampler
+
+def simulateEpisodes(P, R, policy, start_state, max_steps=100, num_episodes=1000, terminal_mask=None, rng=None,
+                     sampler=None):
+    """
+    Simulate num_episodes episodes of a policy in lockstep and return the total reward of each.
+
+    Parameters:
+    - P, R: Array form of the MDP (see MDP.P and MDP.R)
+    - policy: Length-S array of action indices
+    - start_state: Integer index of the start state (or an array with one start state per episode)
+    - max_steps: Maximum number of steps per episode
+    - num_episodes: Number of episodes to simulate
+    - terminal_mask: Optional boolean array, True for states that end an episode on arrival
+    - rng: np.random.Generator, or a seed for np.random.default_rng
+    - sampler: Optional TransitionSampler over the (S*A, S) rows of P, e.g. MDP.transition_sampler().
+               Without one, a sampler for the policy's Markov chain is built for this call.
+
+    Returns:
+    - Array of length num_episodes with the undiscounted return of each episode
+    """
+    rng = np.random.default_rng(rng)
+    P_pi, R_pi = policyModel(P, R, policy)
+
+    # sampler row used for each state under the policy
+    if sampler is None:
+        sampler = TransitionSampler(P_pi)
+        policy_rows = np.arange(R.shape[0])
+    else:
+        policy_rows = np.arange(R.shape[0]) * R.shape[1] + policy
+
+    return _runEpisodes(sampler, policy_rows, R_pi, start_state, max_steps, num_episodes, terminal_mask, rng)
+
+def _runEpisodes(sampler, policy_rows, R_pi, start_state, max_steps, num_episodes, terminal_mask, rng):
+    current_states = np.broadcast_to(np.asarray(start_state, dtype=np.intp), (num_episodes,)).copy()
+    episode_rewards = np.zeros(num_episodes)
+    active = np.arange(num_episodes)
+
+    for _ in range(max_steps):
+        # retire episodes that have reached a terminal state
+        if terminal_mask is not None:
+            active = active[~terminal_mask[current_states[active]]]
+        if active.size == 0:
+            break
+
+        states = current_states[active]
+        episode_rewards[active] += R_pi[states]
+        current_states[active] = sampler.sample(policy_rows[states], rng.random(active.size))
+
+    return episode_rewards
+
+"""
+Parallel Rollouts
+
+    episodes are split into num_shards fixed, contiguous shards and shard i draws from the i-th child of
+    np.random.SeedSequence(seed), so the returns depend only on (seed, num_shards) and not on how many
+    workers run the shards or in which order they finish. each shard reports (count, mean, sum of squared
+    deviations), and the shards are merged in shard order with Chan's pairwise update.
+"""
+
+def _toSharedMemory(arrays):
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+def _attachSharedMemory(specs):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+def _simulateShard(method, specs, start_state, max_steps, num_episodes, seed_sequence):
+    blocks, arrays = _attachSharedMemory(specs)
+    R_pi, terminal_mask = arrays.pop("R_pi"), arrays.pop("terminal_mask", None)
+    sampler = TransitionSampler.from_arrays(method, arrays)
+
+    returns = _runEpisodes(sampler, np.arange(R_pi.shape[0]), R_pi, start_state, max_steps, num_episodes,
+                           terminal_mask, np.random.default_rng(seed_sequence))
+
+    # the views into shared memory have to go before the blocks can be closed
+    del sampler, arrays, R_pi, terminal_mask
+    for block in blocks:
+        block.close()
+
+    return num_episodes, returns.mean(), ((returns - returns.mean()) ** 2).sum()
+
+def parallelSimulateEpisodes(P, R, policy, start_state, max_steps=100, num_episodes=1000, terminal_mask=None,
+                             seed=None, num_workers=None, num_shards=None, confidence=0.95, method="alias"):
+    """
+    Simulate num_episodes episodes of a policy on a pool of worker processes and summarise their returns.
+
+    Parameters:
+    - P, R, policy, start_state, max_steps, num_episodes, terminal_mask: As for simulateEpisodes
+    - seed: Integer seed or np.random.SeedSequence; the same seed and num_shards give bit-identical results
+    - num_workers: Number of worker processes (defaults to the CPU count); 1 runs the shards in this process
+    - num_shards: Number of episode shards, each with its own random stream (defaults to num_workers)
+    - confidence: Confidence level of the normal-approximation interval on the mean return
+    - method: Sampling method of the TransitionSampler ("alias" or "cdf")
+
+    Returns:
+    - Dictionary with "episodes", "mean", "variance" (sample variance), "std_error" and "confidence_interval";
+      with num_episodes=0 the statistics are NaN, like the mean of simulateEpisodes' empty result
+    """
+    if num_episodes == 0:
+        return {"episodes": 0, "mean": float("nan"), "variance": float("nan"), "std_error": float("nan"),
+                "confidence_interval": (float("nan"), float("nan"))}
+
+    num_workers = num_workers or os.cpu_count() or 1
+    num_shards = min(num_shards or num_workers, num_episodes)
+
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    shard_seeds = seed_sequence.spawn(num_shards)
+    shard_sizes = [len(shard) for shard in np.array_split(np.arange(num_episodes), num_shards)]
+
+    P_pi, R_pi = policyModel(P, R, policy)
+    sampler = TransitionSampler(P_pi, method)
+    arrays = dict(sampler.arrays(), R_pi=R_pi)
+    if terminal_mask is not None:
+        arrays["terminal_mask"] = np.asarray(terminal_mask, dtype=bool)
+
+    blocks, specs = _toSharedMemory(arrays)
+    try:
+        shard_args = [(method, specs, start_state, max_steps, size, shard_seed)
+                      for size, shard_seed in zip(shard_sizes, shard_seeds)]
+        if num_workers == 1:
+            shard_results = [_simulateShard(*args) for args in shard_args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(num_workers, num_shards)) as executor:
+                shard_results = list(executor.map(_simulateShard, *zip(*shard_args)))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # merge per-shard (count, mean, squared deviations) in shard order
+    count, mean, squared_deviations = shard_results[0]
+    for shard_count, shard_mean, shard_squared_deviations in shard_results[1:]:
+        total = count + shard_count
+        difference = shard_mean - mean
+        mean += difference * shard_count / total
+        squared_deviations += shard_squared_deviations + difference ** 2 * count * shard_count / total
+        count = total
+
+    variance = squared_deviations / (count - 1) if count > 1 else 0.0
+    std_error = np.sqrt(variance / count)
+    half_width = norm.ppf(0.5 + confidence / 2) * std_error
+
+    return {
+        "episodes": int(count),
+        "mean": float(mean),
+        "variance": float(variance),
+        "std_error": float(std_error),
+        "confidence_interval": (float(mean - half_width), float(mean + half_width))
+    }
@@ -117,26 +117,29 @@ transition_matrix, reward_matrix, actions = selfDrivingCarMDP.convert_to_diction
 Dynamic Programming algorithms with Visual Comparison
 """
 
-from visualComparison import visual_algorithm_comparison
-from plotDescription import describe_plots
+# the model above can be imported (e.g. by benchmarkSuite) without running the comparison
+if __name__ == "__main__":
+    from visualComparison import visual_algorithm_comparison
+    from plotDescription import describe_plots
 
-# Run visual algorithm comparison
-print("SELF-DRIVING CAR MDP: VISUAL ALGORITHM ANALYSIS")
-print("=" * 60)
+    # Run visual algorithm comparison
+    print("SELF-DRIVING CAR MDP: VISUAL ALGORITHM ANALYSIS")
+    print("=" * 60)
 
-results = visual_algorithm_comparison(
-    states=selfDrivingCarMDP.states,
-    actions=actions,
-    transition_matrix=transition_matrix,
-    reward_matrix=reward_matrix,
-    start_state='Clear Road',
-    gamma=0.9,
-    theta=1e-3,
-    save_plots=True  # Set to True to save plots as files
-)
+    results = visual_algorithm_comparison(
+        states=selfDrivingCarMDP.states,
+        actions=actions,
+        transition_matrix=transition_matrix,
+        reward_matrix=reward_matrix,
+        start_state='Clear Road',
+        gamma=0.9,
+        theta=1e-3,
+        save_plots=True,  # Set to True to save plots as files
+        cache=True  # Reuse solutions of an unchanged model; set MDP_SOLVE_CACHE to keep them between runs
+    )
 
-print("\nVisual comparison complete!")
-print("Three plots have been saved:")
-print("   • value_evolution.png")
-print("   • convergence_comparison.png") 
-print("   • final_values_comparison.png")
+    print("\nVisual comparison complete!")
+    print("Three plots have been saved:")
+    print("   • value_evolution.png")
+    print("   • convergence_comparison.png") 
+    print("   • final_values_comparison.png")
@@ -0,0 +1,99 @@
+"""
+Solve Budgets
+
+    anytime solving: pass budget=SolveBudget(seconds=..., max_backups=...) to valueIteration, policyIteration or
+    their array versions and the solver stops once the budget runs out, even if theta hasn't been reached, and
+    returns the greedy policy with respect to its current V. the budget then holds a certified bound on how far
+    that policy is from optimal, taken from the Bellman residual of V (see bellman.suboptimalityBound):
+
+        V_policy >= V* - bound in every state, bound = 2 * gamma * residual / (1 - gamma)
+
+    the bound is filled in whether or not the budget ran out, so a converged solve reports its own guarantee.
+
+    budgets are checked before every Jacobi sweep and policy iteration round, which only start if their backups
+    fit in what is left of max_backups (policy evaluation sweeps are cut short to fit), and after every
+    single-state backup of Gauss-Seidel and prioritized sweeping. a vectorized sweep or a policy evaluation can
+    still overrun a deadline by its own length (modified policy iteration, sweeps=k, keeps policy iteration rounds
+    short). the bound costs one extra synchronous backup where the solver doesn't already compute the residual of
+    its final V.
+
+    a budget is started by the solver it is passed to, so one SolveBudget can be reused for solve after solve,
+    e.g. replanning every control cycle with the same deadline.
+"""
+
+import time
+from bellman import suboptimalityBound
+
+
+class SolveBudget:
+    def __init__(self, seconds=None, max_backups=None):
+        """
+        Parameters:
+        - seconds: Wall-clock budget, measured from the start of the solve
+        - max_backups: Maximum number of single-state Bellman backups (policy evaluation sweeps count one per state)
+        """
+        self.seconds = seconds
+        self.max_backups = max_backups
+        self.start()
+
+    def start(self):
+        """
+        Reset the budget for a new solve; the solvers call this themselves.
+        """
+        self.start_time = time.perf_counter()
+        self.deadline = None if self.seconds is None else self.start_time + self.seconds
+        self.backups = 0
+        self.exhausted = False
+        self.converged = False
+        self.residual = None
+        self.bound = None
+        self.elapsed = 0.0
+
+    def spend(self, backups=1):
+        """
+        Charge backups against the budget and return True once it has run out.
+        """
+        self.backups += backups
+        if (self.max_backups is not None and self.backups >= self.max_backups) or \
+                (self.deadline is not None and time.perf_counter() >= self.deadline):
+            self.exhausted = True
+        return self.exhausted
+
+    def remaining(self):
+        """
+        Backups left before max_backups is reached, or None without a backup limit.
+        """
+        return None if self.max_backups is None else max(self.max_backups - self.backups, 0)
+
+    def allows(self, backups):
+        """
+        Check before spending: True if backups more fit in the budget and time is left, otherwise it has run out.
+        """
+        remaining = self.remaining()
+        if (remaining is not None and backups > remaining) or \
+                (self.deadline is not None and time.perf_counter() >= self.deadline):
+            self.exhausted = True
+        return not self.exhausted
+
+    def finish(self, residual, gamma, converged):
+        """
+        Record how the solve ended: the Bellman residual of the returned V and whether theta was reached.
+        """
+        self.elapsed = time.perf_counter() - self.start_time
+        self.residual = float(residual)
+        self.bound = suboptimalityBound(self.residual, gamma)
+        self.converged = bool(converged)
+
+    def to_dict(self):
+        return {
+            "converged": self.converged,
+            "exhausted": self.exhausted,
+            "residual": self.residual,
+            "bound": self.bound,
+            "backups": self.backups,
+            "elapsed": self.elapsed
+        }
+
+    def __repr__(self):
+        return (f"SolveBudget(seconds={self.seconds!r}, max_backups={self.max_backups!r}, converged={self.converged}, "
+                f"bound={self.bound!r})")
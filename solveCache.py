@@ -0,0 +1,216 @@
+"""
+Solve Cache
+
+    stores solved V and policy arrays under a content hash of the compiled model (P, R and the terminal mask),
+    gamma, theta, the solver name and its options, so solving an identical model again returns the stored
+    solution instead of sweeping from zero. the hash is over the arrays, not the labels, so the same model
+    built with differently named states still hits; the solution comes back labelled by the current model.
+
+    two levels:
+    - memo: the most recently used entries of this process, in memory
+    - disk: optional directory of one .npz file per entry, shared between processes. entries are written to a
+      temporary file and moved into place, so concurrent jobs never read half-written files. reading an entry
+      refreshes its modification time and the least recently used files are deleted once the directory grows
+      past max_bytes.
+
+    solver(..., cache=True) uses a process-wide cache whose directory is taken from the MDP_SOLVE_CACHE
+    environment variable (memo only when it's unset); pass a SolveCache to use your own.
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sp
+from valueHistory import ValueHistory
+
+# bump when the hashed inputs or the stored entries change meaning, so older entries are never read back
+CACHE_FORMAT_VERSION = 1
+
+CACHE_DIRECTORY_VARIABLE = "MDP_SOLVE_CACHE"
+
+
+def solveKey(P, R, gamma, theta, solver, terminal_mask=None, **options):
+    """
+    Hex digest identifying a solve: the model arrays, gamma, theta, the solver name and any options that change
+    its result (stopping rule, schedule, ...). options must have stable reprs.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    header = (CACHE_FORMAT_VERSION, solver, float(gamma), float(theta), sorted(options.items()))
+    digest.update(repr(header).encode())
+
+    if sp.issparse(P):
+        P = sp.csr_matrix(P)
+        if not P.has_canonical_format:
+            P = P.copy()
+            P.sum_duplicates()
+        digest.update(repr(("csr", P.shape)).encode())
+        arrays = [P.data, P.indices, P.indptr]
+    else:
+        digest.update(repr(("dense", P.shape)).encode())
+        arrays = [P]
+    arrays.append(R)
+    if terminal_mask is not None:
+        arrays.append(terminal_mask)
+
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(array.dtype.str.encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class SolveCache:
+    def __init__(self, directory=None, max_bytes=256 * 2**20, memo_size=32):
+        """
+        Parameters:
+        - directory: Optional directory for the on-disk entries (created if missing); memo only without it
+        - max_bytes: Size cap of the directory, enforced by deleting the least recently used entries
+        - memo_size: Number of entries kept in memory
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def _remember(self, key, entry):
+        self._memo[key] = entry
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def get(self, key):
+        """
+        The stored entry ({name: array}) for key, or None.
+        """
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return self._memo[key]
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with np.load(path) as data:
+                    entry = {name: data[name] for name in data.files}
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, zipfile.BadZipFile):
+                # unreadable entry, e.g. from a crashed writer on a filesystem without atomic replace
+                self._discard(path)
+            else:
+                for array in entry.values():
+                    array.setflags(write=False)
+                self._remember(key, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """
+        Store an entry ({name: array}) under key.
+        """
+        entry = {name: np.array(array) for name, array in entry.items()}
+        for array in entry.values():
+            array.setflags(write=False)
+        self._remember(key, entry)
+
+        if self.directory is None:
+            return
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **entry)
+        os.replace(temporary_path, self._path(key))
+        self._evict()
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._discard(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        """
+        Drop every entry, in memory and on disk.
+        """
+        self._memo.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    self._discard(os.path.join(self.directory, name))
+
+
+_default_cache = None
+
+def resolveCache(cache):
+    """
+    Resolve a solver's cache argument: True uses the process-wide default cache (see above), a SolveCache is
+    used as given and False or None disables caching.
+    """
+    global _default_cache
+    if isinstance(cache, SolveCache):
+        return cache
+    if not cache:
+        return None
+    if _default_cache is None:
+        _default_cache = SolveCache(os.environ.get(CACHE_DIRECTORY_VARIABLE))
+    return _default_cache
+
+
+def storeSolution(cache, key, V, policy, iterations, value_history=None):
+    """
+    Store a dictionary solver's result, including its value history when one was recorded.
+    """
+    entry = {"V": V, "policy": policy, "iterations": np.int64(iterations)}
+    if value_history is not None:
+        entry["history_iterations"] = value_history.iterations
+        entry["history_values"] = value_history.values
+    cache.put(key, entry)
+
+
+def cachedSolution(cache, key, mdp, track_history):
+    """
+    A dictionary solver's stored result as (V, policy, value history or None, iterations), or None when it is
+    not cached (or was cached without the history that track_history asks for).
+    """
+    entry = cache.get(key)
+    if entry is None or (track_history and "history_values" not in entry):
+        return None
+
+    value_history = None
+    if track_history:
+        value_history = ValueHistory(mdp.num_states, capacity=max(len(entry["history_iterations"]), 1),
+                                     state_labels=mdp.state_labels)
+        for iteration, V in zip(entry["history_iterations"].tolist(), entry["history_values"]):
+            value_history.record(iteration, V, force=True)
+
+    return entry["V"], entry["policy"], value_history, int(entry["iterations"])
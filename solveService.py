@@ -0,0 +1,533 @@
+"""
+Solve Service
+
+    an asyncio service that runs solves off the caller's thread, so many concurrent policy requests share
+    solver processes instead of each blocking on a full solve.
+
+    - jobs are solved on a bounded process pool (max_workers processes)
+    - identical jobs (same content hash of P, R, gamma, theta, solver and stopping rule, see solveCache.solveKey)
+      submitted while one is queued or running share that job instead of solving again; with a cache, finished
+      solves are answered from it (under the same keys as valueIteration / policyIteration with cache=...)
+    - every job streams events to its subscribers: "queued", "running", "progress" (iteration and delta, at
+      most every progress_interval seconds), then one of "done", "failed", "cancelled" or "expired"
+    - jobs can be cancelled, and can be given a deadline in seconds after which they expire. a job shared by
+      several submitters is only cancelled once all of them have cancelled it, and its deadline is the latest
+      of theirs. a running solve stops at its next iteration
+
+    a small HTTP front end (serve, or python solveService.py --port 8080 / --socket path) exposes it:
+        POST   /jobs              submit a job (JSON, see modelFromJSON), returns {"job": id, ...}
+        GET    /jobs/<id>         status, including the result once the job is done
+        GET    /jobs/<id>/result  wait for the job to finish and return its status and result
+        GET    /jobs/<id>/events  stream the job's events as newline-delimited JSON
+        DELETE /jobs/<id>         cancel the job
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from MDP import MDP
+from policyIteration import batchedPolicyIteration
+from solveCache import SolveCache, resolveCache, solveKey
+from valueIteration import batchedValueIteration, gaussSeidelValueIteration, prioritizedSweeping
+
+SOLVERS = ("value_iteration", "gauss_seidel", "prioritized_sweeping", "policy_iteration")
+
+# the cache key of each solver's jobs, matching valueIteration / policyIteration so they share cached solves
+_CACHE_KEYS = {
+    "value_iteration": ("value_iteration", {"schedule": "jacobi", "order": None}),
+    "gauss_seidel": ("value_iteration", {"schedule": "gauss-seidel", "order": None}),
+    "prioritized_sweeping": ("value_iteration", {"schedule": "prioritized", "order": None}),
+    "policy_iteration": ("policy_iteration", {"evaluation": "sweep", "sweeps": None})
+}
+
+# job states after which nothing changes any more
+FINISHED = ("done", "failed", "cancelled", "expired")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobExpired(Exception):
+    pass
+
+
+"""
+Worker Side
+    runs in the pool's processes. the observer reports progress through the manager queue and checks the job's
+    cancel event, both at most every progress_interval seconds so the IPC stays off the solver's hot path.
+"""
+
+def _solveJob(job_id, P, R, solver, gamma, theta, stopping, terminal_mask, progress, cancel_event,
+              progress_interval):
+    if cancel_event.is_set():
+        raise JobCancelled(job_id)
+    progress.put((job_id, "running", 0, None))
+
+    last_report = [0.0]
+    last_delta = [None]
+    def observer(solver_name, iteration, delta, V):
+        last_delta[0] = float(delta)
+        now = time.monotonic()
+        if now - last_report[0] >= progress_interval:
+            last_report[0] = now
+            progress.put((job_id, "progress", iteration, float(delta)))
+            if cancel_event.is_set():
+                raise JobCancelled(job_id)
+
+    if solver == "value_iteration":
+        V, policy, _, iterations = batchedValueIteration(P, R, gamma, theta, stopping=stopping, observers=[observer],
+                                                         terminal_mask=terminal_mask, return_iterations=True)
+    elif solver == "gauss_seidel":
+        V, policy, _, iterations = gaussSeidelValueIteration(P, R, gamma, theta, stopping=stopping,
+                                                             observers=[observer], terminal_mask=terminal_mask,
+                                                             return_iterations=True)
+    elif solver == "prioritized_sweeping":
+        V, policy, backups = prioritizedSweeping(P, R, gamma, theta, stopping, observers=[observer],
+                                                 terminal_mask=terminal_mask)
+        iterations = -(-backups // R.shape[0])
+    else:
+        V, policy, _, iterations = batchedPolicyIteration(P, R, gamma, theta, stopping=stopping, observers=[observer],
+                                                          terminal_mask=terminal_mask, return_iterations=True)
+    # the delta of the final iteration, which the throttled progress messages have most likely skipped
+    return V, policy, iterations, last_delta[0]
+
+
+"""
+Service
+"""
+
+class _Job:
+    def __init__(self, job_id, key, mdp, solver, gamma, theta, stopping):
+        self.id = job_id
+        self.key = key
+        self.mdp = mdp
+        self.solver = solver
+        self.gamma = gamma
+        self.theta = theta
+        self.stopping = stopping
+        self.status = "queued"
+        self.submitted = time.time()
+        self.finished = None
+        self.clients = 0
+        self.deadline = None
+        self.deadline_handle = None
+        self.iteration = 0
+        self.delta = None
+        self.result = None
+        self.error = None
+        self.cancel_event = None
+        self.future = None
+        self.subscribers = []
+        self.done = asyncio.Event()
+
+    def describe(self, with_result=False):
+        description = {
+            "job": self.id,
+            "status": self.status,
+            "solver": self.solver,
+            "gamma": self.gamma,
+            "theta": self.theta,
+            "states": self.mdp.num_states,
+            "submitted": self.submitted,
+            "finished": self.finished,
+            "clients": self.clients,
+            "iteration": self.iteration,
+            "delta": self.delta,
+            "error": self.error
+        }
+        if with_result and self.result is not None:
+            V, policy, iterations = self.result
+            description["iterations"] = iterations
+            description["V"] = self.mdp.label_values(V)
+            description["policy"] = self.mdp.label_policy(policy)
+        return description
+
+
+class SolveService:
+    def __init__(self, max_workers=None, cache=None, progress_interval=0.05, keep_finished=1000):
+        """
+        Parameters:
+        - max_workers: Size of the solver process pool (defaults to the CPU count)
+        - cache: Optional SolveCache (or True for the default one) answering repeated solves (see solveCache)
+        - progress_interval: Minimum time in seconds between progress events (and cancellation checks) of a job
+        - keep_finished: Number of finished jobs whose status and result stay available
+        """
+        self.max_workers = max_workers
+        self.cache = resolveCache(cache)
+        self.progress_interval = progress_interval
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._in_flight = {}
+        self._pool = None
+        self._manager = None
+        self._pending = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        # cache disk I/O and manager round-trips block, so they run on this thread instead of the event loop.
+        # a single thread keeps them in order: a cache entry is stored before a later lookup reads it
+        self._io = ThreadPoolExecutor(max_workers=1)
+        self._manager = await loop.run_in_executor(self._io, multiprocessing.Manager)
+        self._progress = await loop.run_in_executor(self._io, self._manager.Queue)
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._reader = threading.Thread(target=self._readProgress, daemon=True)
+        self._reader.start()
+        return self
+
+    async def close(self):
+        for job in list(self._in_flight.values()):
+            self._cancel(job, "cancelled")
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        await loop.run_in_executor(None, self._pool.shutdown)
+        await loop.run_in_executor(self._io, self._progress.put, None)
+        await loop.run_in_executor(None, self._reader.join)
+        await loop.run_in_executor(self._io, self._manager.shutdown)
+        self._io.shutdown()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _background(self, function, *args):
+        # run a blocking call on the I/O thread without waiting for it; close() waits for any still running
+        future = self._loop.run_in_executor(self._io, function, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    def _readProgress(self):
+        # worker messages arrive on the manager queue; hand them to the event loop
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._onProgress, *message)
+
+    def _onProgress(self, job_id, event, iteration, delta):
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return
+        job.status = "running"
+        job.iteration = iteration
+        job.delta = delta
+        self._publish(job, event)
+
+    def _publish(self, job, event):
+        message = {"job": job.id, "event": event, "iteration": job.iteration, "delta": job.delta}
+        if event in FINISHED:
+            message["error"] = job.error
+        for subscriber in job.subscribers:
+            subscriber.put_nowait(message)
+
+    async def submit(self, mdp, solver="value_iteration", gamma=None, theta=1e-3, stopping="delta", deadline=None):
+        """
+        Queue a solve of mdp and return its job id, or the id of an identical job already queued or running.
+
+        Parameters:
+        - mdp: The MDP to solve
+        - solver: One of SOLVERS
+        - gamma: Discount factor (defaults to mdp.discount_factor)
+        - theta, stopping: Convergence threshold and stopping rule (see bellman.stoppingThreshold)
+        - deadline: Optional number of seconds after which the job expires if it hasn't finished
+        """
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}, expected one of {', '.join(SOLVERS)}")
+        gamma = mdp.discount_factor if gamma is None else gamma
+        loop = asyncio.get_running_loop()
+
+        # hashing a large model takes a while, so keep it off the event loop
+        terminal_mask = mdp.terminal_mask
+        key_solver, options = _CACHE_KEYS[solver]
+        key = await loop.run_in_executor(None, lambda: solveKey(mdp.P, mdp.R, gamma, theta, key_solver, terminal_mask,
+                                                                stopping=stopping, **options))
+
+        job = self._in_flight.get(key)
+        if job is not None:
+            job.clients += 1
+            self._extendDeadline(job, deadline)
+            return job.id
+
+        # registered before the awaits below, so identical submissions arriving meanwhile join this job
+        job = _Job(uuid.uuid4().hex, key, mdp, solver, gamma, theta, stopping)
+        self._jobs[job.id] = job
+        self._in_flight[key] = job
+        job.clients += 1
+        self._extendDeadline(job, deadline)
+
+        # a job cancelled or expired while waiting on the lookups below has already been finished
+        cached = await loop.run_in_executor(self._io, self.cache.get, key) if self.cache is not None else None
+        if job.status in FINISHED:
+            return job.id
+        if cached is not None:
+            job.result = (cached["V"], cached["policy"], int(cached.get("iterations", 0)))
+            self._finish(job, "done")
+            return job.id
+
+        job.cancel_event = await loop.run_in_executor(self._io, self._manager.Event)
+        if job.status in FINISHED:
+            return job.id
+        job.future = self._pool.submit(_solveJob, job.id, mdp.P, mdp.R, solver, gamma, theta, stopping,
+                                       terminal_mask, self._progress, job.cancel_event, self.progress_interval)
+        job.future.add_done_callback(lambda future: loop.call_soon_threadsafe(self._onDone, job, future))
+        self._publish(job, "queued")
+        return job.id
+
+    def _extendDeadline(self, job, deadline):
+        # a shared job keeps running until its most patient submitter's deadline
+        if job.status in FINISHED or (job.clients > 1 and job.deadline is None):
+            return
+        if deadline is None:
+            new_deadline = None
+        else:
+            new_deadline = self._loop.time() + deadline
+            if job.deadline is not None:
+                new_deadline = max(new_deadline, job.deadline)
+
+        if job.deadline_handle is not None:
+            job.deadline_handle.cancel()
+            job.deadline_handle = None
+        job.deadline = new_deadline
+        if new_deadline is not None:
+            job.deadline_handle = self._loop.call_at(new_deadline, self._cancel, job, "expired")
+
+    def _onDone(self, job, future):
+        if job.status in FINISHED:
+            return
+        if future.cancelled():
+            self._finish(job, "cancelled")
+            return
+        error = future.exception()
+        if isinstance(error, JobCancelled):
+            # the job was stopped by cancel or by its deadline, which already finished it
+            self._finish(job, "cancelled")
+        elif error is not None:
+            job.error = f"{type(error).__name__}: {error}"
+            self._finish(job, "failed")
+        else:
+            V, policy, iterations, delta = future.result()
+            job.result = (V, policy, iterations)
+            job.iteration = iterations
+            if delta is not None:
+                job.delta = delta
+            if self.cache is not None:
+                self._background(self.cache.put, job.key, {"V": V, "policy": policy, "iterations": iterations})
+            self._finish(job, "done")
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        if job.deadline_handle is not None:
+            job.deadline_handle.cancel()
+        if self._in_flight.get(job.key) is job:
+            del self._in_flight[job.key]
+        self._publish(job, status)
+        job.done.set()
+
+        self._finished[job.id] = job
+        while len(self._finished) > self.keep_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+    def _cancel(self, job, status):
+        if job.status in FINISHED:
+            return
+        # before the cancel event exists the job hasn't been handed to the pool yet, and submit won't hand it over
+        if job.cancel_event is not None:
+            self._background(job.cancel_event.set)
+        if job.future is not None:
+            job.future.cancel()
+        if status == "expired":
+            job.error = "deadline exceeded"
+        self._finish(job, status)
+
+    def _job(self, job_id):
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            raise KeyError(f"Unknown job {job_id!r}") from None
+
+    def cancel(self, job_id):
+        """
+        Withdraw one submitter's interest in a job; the job is cancelled once no submitter is left.
+        Returns True if the job was cancelled.
+        """
+        job = self._job(job_id)
+        if job.status in FINISHED:
+            return False
+        job.clients -= 1
+        if job.clients > 0:
+            return False
+        self._cancel(job, "cancelled")
+        return True
+
+    def status(self, job_id, with_result=True):
+        """
+        The job's status as a dictionary; with_result adds "V", "policy" and "iterations" once it is done.
+        """
+        return self._job(job_id).describe(with_result)
+
+    async def result(self, job_id, timeout=None):
+        """
+        Wait for a job and return (V, policy, iterations) as {state: value} and {state: action} dictionaries.
+        Raises JobCancelled, JobExpired or RuntimeError (with the solver's error) if it didn't finish.
+        """
+        job = self._job(job_id)
+        await asyncio.wait_for(job.done.wait(), timeout)
+        if job.status == "cancelled":
+            raise JobCancelled(job_id)
+        if job.status == "expired":
+            raise JobExpired(job_id)
+        if job.status == "failed":
+            raise RuntimeError(job.error)
+        V, policy, iterations = job.result
+        return job.mdp.label_values(V), job.mdp.label_policy(policy), iterations
+
+    async def events(self, job_id):
+        """
+        Async iterator over the job's events (see above), starting with its current state and ending with the
+        event that finishes it.
+        """
+        job = self._job(job_id)
+        queue = asyncio.Queue()
+        current = "running" if job.status == "running" and job.iteration else job.status
+        queue.put_nowait({"job": job.id, "event": current, "iteration": job.iteration, "delta": job.delta,
+                          **({"error": job.error} if current in FINISHED else {})})
+        if job.status not in FINISHED:
+            job.subscribers.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in FINISHED:
+                    return
+        finally:
+            if queue in job.subscribers:
+                job.subscribers.remove(queue)
+
+
+"""
+HTTP Front End
+"""
+
+def modelFromJSON(spec):
+    """
+    Build the MDP of a job request. spec holds "states" and either
+    - "actions" (list), "transition_matrix" (S x A x S nested lists) and "reward_matrix" (S x A), as for MDP, or
+    - "actions" ({state: [actions]}), "transition_probs" and "rewards" dictionaries, as for MDP.from_dictionary
+    plus optional "gamma" and "terminal_states".
+    """
+    gamma = spec.get("gamma", 0.9)
+    try:
+        if "transition_probs" in spec:
+            return MDP.from_dictionary(spec["states"], spec["actions"], spec["transition_probs"], spec["rewards"],
+                                       gamma, terminal_states=spec.get("terminal_states"))
+        return MDP(spec["states"], spec["actions"], spec["transition_matrix"], spec["reward_matrix"], gamma,
+                   terminal_states=spec.get("terminal_states"))
+    except KeyError as error:
+        raise ValueError(f"Job is missing {error.args[0]!r}") from None
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def _response(status, body):
+    payload = json.dumps(body).encode()
+    head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+    return head.encode() + payload
+
+async def _handleRequest(service, reader, writer):
+    try:
+        method, target, _ = (await reader.readline()).decode().split(" ", 2)
+        length = 0
+        while (line := (await reader.readline()).decode().strip()):
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        body = await reader.readexactly(length) if length else b""
+        parts = [part for part in target.split("?")[0].split("/") if part]
+
+        if parts == ["jobs"] and method == "POST":
+            spec = json.loads(body)
+            loop = asyncio.get_running_loop()
+            mdp = await loop.run_in_executor(None, modelFromJSON, spec)
+            job_id = await service.submit(mdp, spec.get("solver", "value_iteration"), spec.get("gamma"),
+                                          spec.get("theta", 1e-3), spec.get("stopping", "delta"),
+                                          spec.get("deadline"))
+            writer.write(_response(202, service.status(job_id, with_result=False)))
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            writer.write(_response(200, service.status(parts[1])))
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "DELETE":
+            cancelled = service.cancel(parts[1])
+            writer.write(_response(200, {**service.status(parts[1], with_result=False), "cancelled": cancelled}))
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result" and method == "GET":
+            job = service._job(parts[1])
+            await job.done.wait()
+            writer.write(_response(200, service.status(parts[1])))
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events" and method == "GET":
+            service._job(parts[1])
+            events = service.events(parts[1])
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+            try:
+                async for event in events:
+                    writer.write(json.dumps(event).encode() + b"\n")
+                    await writer.drain()
+            except ConnectionError:
+                # the client went away mid-stream; closing the stream unsubscribes it from the job
+                pass
+            finally:
+                await events.aclose()
+        elif parts[:1] == ["jobs"]:
+            writer.write(_response(405, {"error": f"{method} not supported on {target}"}))
+        else:
+            writer.write(_response(404, {"error": f"No route for {target}"}))
+    except KeyError as error:
+        writer.write(_response(404, {"error": str(error.args[0])}))
+    except (ValueError, TypeError) as error:
+        writer.write(_response(400, {"error": str(error)}))
+    finally:
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+async def serve(service, host="127.0.0.1", port=8080, path=None):
+    """
+    Start the HTTP front end on host:port, or on a Unix socket at path. Returns the asyncio server.
+    """
+    def handler(reader, writer):
+        return _handleRequest(service, reader, writer)
+    if path is not None:
+        return await asyncio.start_unix_server(handler, path)
+    return await asyncio.start_server(handler, host, port)
+
+async def _main(args):
+    cache = SolveCache(args.cache_dir) if args.cache_dir else None
+    async with SolveService(args.workers, cache) as service:
+        server = await serve(service, args.host, args.port, args.socket)
+        print(f"Solve service listening on {args.socket or f'{args.host}:{args.port}'}")
+        async with server:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve MDP solves over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--socket", help="listen on this Unix socket path instead of host:port")
+    parser.add_argument("--workers", type=int, help="solver processes (default: CPU count)")
+    parser.add_argument("--cache-dir", help="keep finished solves in a SolveCache at this directory")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
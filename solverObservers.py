@@ -0,0 +1,88 @@
+"""
+Solver Observers
+
+    per-iteration hooks for valueIteration / policyIteration and their array versions.
+    solvers are silent by default; pass observers=[...] to see progress.
+
+    an observer is any callable taking (solver, iteration, delta, V):
+    - solver: name of the solver, e.g. "Value Iteration"
+    - iteration: iteration (sweep or policy-iteration round) number, starting at 1
+    - delta: max change in V over the iteration
+    - V: the current value array, indexed by integer state index. it is the solver's own array, so copy it
+         before keeping it
+"""
+
+import json
+import sys
+import time
+
+
+def notifyObservers(observers, solver, iteration, delta, V):
+    for observer in observers or ():
+        observer(solver, iteration, delta, V)
+
+
+class ProgressObserver:
+    """
+    Writes one progress line per iteration, e.g. "Value Iteration 12: Delta: 0.0031".
+
+    Parameters:
+    - stream: File-like object to write to (defaults to stdout)
+    - every: Only report every n-th iteration
+    """
+
+    def __init__(self, stream=None, every=1):
+        self.stream = stream
+        self.every = every
+
+    def __call__(self, solver, iteration, delta, V):
+        if iteration % self.every == 0:
+            stream = self.stream or sys.stdout
+            stream.write(f"{solver} {iteration}: Delta: {delta:.6g}\n")
+
+
+class JsonLinesObserver:
+    """
+    Writes one JSON object per iteration with the solver name, iteration, delta and seconds since the
+    observer was created.
+
+    Parameters:
+    - target: Path of the file to append to, or a file-like object
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.start_time = time.perf_counter()
+
+    def __call__(self, solver, iteration, delta, V):
+        record = {
+            "solver": solver,
+            "iteration": iteration,
+            "delta": float(delta),
+            "time": time.perf_counter() - self.start_time
+        }
+        line = json.dumps(record) + "\n"
+
+        if isinstance(self.target, str):
+            with open(self.target, "a") as file:
+                file.write(line)
+        else:
+            self.target.write(line)
+
+
+class HistoryObserver:
+    """
+    Captures the delta and a copy of V after every iteration.
+
+    Attributes:
+    - deltas: List of deltas, one per iteration
+    - values: List of value arrays, one per iteration
+    """
+
+    def __init__(self):
+        self.deltas = []
+        self.values = []
+
+    def __call__(self, solver, iteration, delta, V):
+        self.deltas.append(float(delta))
+        self.values.append(V.copy())
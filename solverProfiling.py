@@ -0,0 +1,175 @@
+"""
+Solver Profiling
+
+    opt-in instrumentation of the solvers. pass stats=SolverStats() to valueIteration, policyIteration,
+    PolicyEvaluation, PolicyImprovement (or their array versions) and the solver records where its time goes:
+
+    phases (wall time and number of calls, time.perf_counter):
+        "compile":     turning the dictionaries into P and R arrays
+        "backup":      value iteration sweeps (Bellman backups, including the greedy actions)
+        "evaluation":  policy evaluation
+        "improvement": policy improvement
+        "extraction":  greedy policy extraction after the sweeps and labelling the results as dictionaries
+        "history":     copying value arrays into a ValueHistory
+
+    counters:
+        "backups":     single-state Bellman backups
+        "sweeps":      value iteration sweeps and policy evaluation sweeps
+        "iterations":  value iteration sweeps or policy iteration rounds
+        "linear_solves": policy evaluations done by a linear solver instead of sweeps
+        "cache_hits":  solves answered from a SolveCache (see solveCache)
+
+    with allocations=True every phase also records the bytes it allocated (net) and its peak traced memory,
+    using tracemalloc. phases don't nest, and tracing allocations slows the solver down noticeably.
+
+    without stats the solvers go through phase() / count() below, which return a shared no-op context and
+    do nothing, once per sweep rather than once per state, so the overhead is negligible.
+"""
+
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+_NO_PHASE = nullcontext()
+
+
+class _PhaseTimer:
+    __slots__ = ("stats", "name", "start", "start_memory", "started_tracing")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.allocations:
+            # trace just this phase, unless something else is already tracing
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        phase = self.stats.phases.setdefault(self.name, {"seconds": 0.0, "calls": 0})
+        phase["seconds"] += elapsed
+        phase["calls"] += 1
+
+        if self.stats.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            phase["allocated_bytes"] = phase.get("allocated_bytes", 0) + max(current - self.start_memory, 0)
+            phase["peak_bytes"] = max(phase.get("peak_bytes", 0), peak - self.start_memory)
+            if self.started_tracing:
+                tracemalloc.stop()
+        return False
+
+
+class SolverStats:
+    def __init__(self, solver=None, allocations=False, labels=None):
+        """
+        Parameters:
+        - solver: Name reported with the stats; solvers fill it in when left as None
+        - allocations: If True, also record allocated and peak bytes per phase (traced with tracemalloc)
+        - labels: Optional {name: value} dictionary added to every exported Prometheus sample
+        """
+        self.solver = solver
+        self.allocations = allocations
+        self.labels = dict(labels or {})
+        self.phases = {}
+        self.counters = {}
+
+    def phase(self, name):
+        """
+        Context manager timing one call of a phase.
+        """
+        return _PhaseTimer(self, name)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    @property
+    def total_seconds(self):
+        return sum(phase["seconds"] for phase in self.phases.values())
+
+    def to_dict(self):
+        return {
+            "solver": self.solver,
+            "labels": self.labels,
+            "total_seconds": self.total_seconds,
+            "phases": {name: dict(phase) for name, phase in self.phases.items()},
+            "counters": dict(self.counters)
+        }
+
+    def to_json(self, path=None):
+        """
+        The stats as a JSON string, also written to path if one is given.
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text + "\n")
+        return text
+
+    def to_prometheus(self, prefix="mdp_solver", path=None):
+        """
+        The stats in the Prometheus text exposition format (e.g. for the node exporter's textfile collector),
+        also written to path if one is given.
+        """
+        base_labels = {"solver": self.solver or "unknown", **self.labels}
+
+        def sample(name, value, **labels):
+            labels = ",".join(f'{key}="{_escape(value)}"' for key, value in {**base_labels, **labels}.items())
+            return f"{prefix}_{name}{{{labels}}} {value!r}"
+
+        metrics = [
+            ("phase_seconds_total", "counter", "Wall time spent in each solver phase", "seconds"),
+            ("phase_calls_total", "counter", "Number of times each solver phase ran", "calls"),
+            ("phase_allocated_bytes_total", "counter", "Bytes allocated in each solver phase", "allocated_bytes"),
+            ("phase_peak_bytes", "gauge", "Peak traced memory of each solver phase", "peak_bytes"),
+        ]
+        lines = []
+        for name, kind, description, key in metrics:
+            samples = [sample(name, phase[key], phase=phase_name)
+                       for phase_name, phase in self.phases.items() if key in phase]
+            if samples:
+                lines += [f"# HELP {prefix}_{name} {description}", f"# TYPE {prefix}_{name} {kind}"] + samples
+
+        for counter, value in self.counters.items():
+            lines += [f"# HELP {prefix}_{counter}_total Solver {counter}",
+                      f"# TYPE {prefix}_{counter}_total counter",
+                      sample(f"{counter}_total", value)]
+
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    def __repr__(self):
+        phases = ", ".join(f"{name}={phase['seconds']:.4f}s" for name, phase in self.phases.items())
+        return f"SolverStats({self.solver!r}, {phases}, {self.counters})"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def phase(stats, name):
+    """
+    stats.phase(name), or a no-op context when stats is None.
+    """
+    return _NO_PHASE if stats is None else stats.phase(name)
+
+
+def count(stats, name, amount=1):
+    if stats is not None:
+        stats.count(name, amount)
+
+
+def nameStats(stats, solver):
+    # the first solver to see a stats object names it, so nested calls keep the outer solver's name
+    if stats is not None and stats.solver is None:
+        stats.solver = solver
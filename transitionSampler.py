@@ -0,0 +1,147 @@
+"""
+Transition Sampling
+
+    draws next states for batches of (state, action) rows of a transition matrix, looking only at each row's
+    nonzero successors. built once per transition model and shared by the rollout simulator and any other
+    sampling code (see MDP.transition_sampler, which caches one per MDP).
+
+    rows are the rows of a (rows, S) matrix: row s*A + a of MDP.P in its (S*A, S) form, or row s of a
+    policy's (S, S) Markov chain.
+
+    methods:
+        "alias": Walker/Vose alias tables, O(1) per draw regardless of the number of successors
+        "cdf":   cumulative distribution rows searched with searchsorted, O(log successors) per draw
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+"""
+Alias Table Construction (Vose)
+
+    scale each row's probabilities by its number of successors n, so they average 1. every slot of the row
+    then gets its own probability q <= 1 plus an alias that absorbs the remaining 1 - q. with each row's
+    entries sorted by q, a two-pointer pass pairs the smallest unfinished entry with the current largest
+    one (the donor); when the donor itself drops below 1 it is finished next, donating to its left neighbour.
+    every row takes at most n - 1 steps, and all rows advance together.
+"""
+
+def _aliasTables(row_ids, row_starts, row_lengths, probabilities):
+    num_rows = row_starts.shape[0]
+
+    # sort each row's entries by scaled probability, keeping rows contiguous
+    order = np.lexsort((probabilities, row_ids))
+    scaled = (probabilities * row_lengths[row_ids])[order]
+    threshold = np.ones_like(scaled)
+    alias = np.arange(scaled.shape[0])
+
+    small = row_starts.copy()
+    donor = row_starts + row_lengths - 1
+
+    active = np.flatnonzero(small < donor)
+    while active.size:
+        s, g = small[active], donor[active]
+        donor_done = scaled[g] < 1
+
+        # the donor dropped below 1: finish it, with its left neighbour as the new donor
+        rows, g_done = active[donor_done], g[donor_done]
+        threshold[g_done] = scaled[g_done]
+        alias[g_done] = g_done - 1
+        scaled[g_done - 1] -= 1 - scaled[g_done]
+        donor[rows] -= 1
+
+        # otherwise finish the smallest unfinished entry, aliased to the donor
+        rows, s_done, g_keep = active[~donor_done], s[~donor_done], g[~donor_done]
+        threshold[s_done] = np.minimum(scaled[s_done], 1.0)
+        alias[s_done] = g_keep
+        scaled[g_keep] -= 1 - scaled[s_done]
+        small[rows] += 1
+
+        active = active[small[active] < donor[active]]
+
+    # map slots back from sorted order to the successor they stand for
+    return order, threshold, order[alias]
+
+
+class TransitionSampler:
+    def __init__(self, transition_matrix, method="alias"):
+        """
+        Parameters:
+        - transition_matrix: (rows, S) matrix of next state probabilities, dense or sparse
+        - method: "alias" or "cdf" (see above)
+        """
+        matrix = sp.csr_matrix(transition_matrix, dtype=np.float64)
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+
+        row_lengths = np.diff(matrix.indptr)
+        if np.any(row_lengths == 0):
+            raise ValueError("Every row needs at least one successor with nonzero probability")
+
+        self.method = method
+        self.num_rows = matrix.shape[0]
+        self.row_starts = matrix.indptr[:-1].copy()
+        self.row_lengths = row_lengths
+        row_ids = np.repeat(np.arange(self.num_rows), row_lengths)
+
+        # normalise each row so round-off in the model can't leave mass unaccounted for
+        probabilities = matrix.data / np.add.reduceat(matrix.data, self.row_starts)[row_ids]
+
+        if method == "alias":
+            slots, self.threshold, aliases = _aliasTables(row_ids, self.row_starts, row_lengths, probabilities)
+            self.successors = matrix.indices[slots]
+            self.alias_successors = matrix.indices[aliases]
+        elif method == "cdf":
+            # within row r the cumulative probabilities are shifted by r, so all rows form one sorted array
+            self.flat_cdf = np.cumsum(probabilities)
+            self.flat_cdf -= np.concatenate(([0.0], self.flat_cdf))[self.row_starts][row_ids]
+            row_ends = self.row_starts + row_lengths - 1
+            self.flat_cdf[row_ends] = 1.0
+            self.flat_cdf += row_ids
+            self.successors = matrix.indices
+        else:
+            raise ValueError(f"Unknown sampling method {method!r}")
+
+    def arrays(self):
+        """
+        The arrays that make up the sampler, e.g. for placing them in shared memory (see from_arrays).
+        """
+        names = ["row_starts", "row_lengths", "successors"]
+        names += ["threshold", "alias_successors"] if self.method == "alias" else ["flat_cdf"]
+        return {name: getattr(self, name) for name in names}
+
+    @classmethod
+    def from_arrays(cls, method, arrays):
+        """
+        Rebuild a sampler around arrays returned by arrays(), without copying them.
+        """
+        sampler = cls.__new__(cls)
+        sampler.method = method
+        sampler.num_rows = arrays["row_starts"].shape[0]
+        for name, array in arrays.items():
+            setattr(sampler, name, array)
+        return sampler
+
+    def sample(self, rows, uniforms):
+        """
+        Next states for an array of row indices, given one uniform draw in [0, 1) per row.
+        """
+        if self.method == "cdf":
+            positions = np.searchsorted(self.flat_cdf, rows + uniforms, side="right")
+            # guards against round-off pushing a draw past the end of its row
+            positions = np.minimum(positions, self.row_starts[rows] + self.row_lengths[rows] - 1)
+            return self.successors[positions]
+
+        # the integer part of u * n picks a slot, the fractional part decides between it and its alias
+        scaled = uniforms * self.row_lengths[rows]
+        slot_offsets = np.minimum(scaled.astype(np.intp), self.row_lengths[rows] - 1)
+        slots = self.row_starts[rows] + slot_offsets
+        keep = (scaled - slot_offsets) < self.threshold[slots]
+        return np.where(keep, self.successors[slots], self.alias_successors[slots])
+
+    def sample_rows(self, rows, rng=None):
+        """
+        Next states for an array of row indices, drawing the uniforms from rng (a Generator or seed).
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        return self.sample(rows, np.random.default_rng(rng).random(rows.shape))
@@ -0,0 +1,154 @@
+"""
+Value History Recording
+
+    records the value function over the iterations of a solver into one preallocated (iterations, states)
+    array instead of a list of per-iteration copies. the array doubles in size when full, can keep only
+    every k-th iteration and a subset of states, and can live in a memory-mapped .npy file.
+
+    rows are read back with array slicing, e.g. history.values[:, j] is the trajectory of the j-th tracked state.
+"""
+
+import os
+import numpy as np
+
+
+class ValueHistory:
+    def __init__(self, num_states, every=1, states=None, dtype=np.float64, capacity=64, path=None, state_labels=None):
+        """
+        Parameters:
+        - num_states: Number of states in the value arrays passed to record
+        - every: Keep only every k-th iteration (the final iteration is always kept)
+        - states: Optional subset of states to track, as integer indices or as labels when state_labels is given
+        - dtype: Storage dtype, e.g. np.float32 to halve memory
+        - capacity: Initial number of rows; the array doubles whenever it fills up
+        - path: If given, store the rows in a memory-mapped .npy file at this path instead of in memory
+        - state_labels: Optional list of state labels, indexed like the value arrays
+        """
+        self.every = every
+        self.dtype = np.dtype(dtype)
+        self.path = path
+        self.state_labels = list(state_labels) if state_labels is not None else None
+
+        if states is None:
+            self.tracked = np.arange(num_states)
+        elif self.state_labels is not None and not all(isinstance(state, (int, np.integer)) for state in states):
+            index = {label: i for i, label in enumerate(self.state_labels)}
+            self.tracked = np.array([index[state] for state in states], dtype=np.intp)
+        else:
+            self.tracked = np.asarray(states, dtype=np.intp)
+        self._tracked_all = states is None
+
+        self._size = 0
+        self._iterations = np.zeros(capacity, dtype=np.int64)
+        self._data = self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        shape = (capacity, len(self.tracked))
+        if self.path is None:
+            return np.empty(shape, dtype=self.dtype)
+        return np.lib.format.open_memmap(self.path, mode="w+", dtype=self.dtype, shape=shape)
+
+    def _grow(self):
+        capacity = 2 * len(self._iterations)
+        old_data = self._data
+
+        if self.path is None:
+            self._data = self._allocate(capacity)
+            self._data[:self._size] = old_data[:self._size]
+        else:
+            # write the larger file alongside the old one, then move it into place
+            final_path, self.path = self.path, self.path + ".grow.npy"
+            self._data = self._allocate(capacity)
+            self._data[:self._size] = old_data[:self._size]
+            self._data.flush()
+            del old_data
+            os.replace(self.path, final_path)
+            self.path = final_path
+            self._data = np.load(final_path, mmap_mode="r+")
+
+        self._iterations = np.concatenate([self._iterations, np.zeros(capacity - len(self._iterations), dtype=np.int64)])
+
+    def record(self, iteration, V, force=False):
+        """
+        Store V (a length-S value array) for this iteration if it falls on the downsampling grid, or if force is True.
+        """
+        if not force and iteration % self.every != 0:
+            return
+        if self._size and self._iterations[self._size - 1] == iteration:
+            return
+        if self._size == len(self._iterations):
+            self._grow()
+
+        self._data[self._size] = V if self._tracked_all else V[self.tracked]
+        self._iterations[self._size] = iteration
+        self._size += 1
+
+    def finish(self, iteration, V):
+        """
+        Make sure the final iteration is recorded even when it is off the downsampling grid.
+        """
+        self.record(iteration, V, force=True)
+        if self.path is not None:
+            self._data.flush()
+
+    # lets a ValueHistory be passed directly as a solver observer (see solverObservers)
+    def __call__(self, solver, iteration, delta, V):
+        self.record(iteration, V)
+
+    @property
+    def values(self):
+        """
+        Recorded rows as a (recorded iterations, tracked states) array view.
+        """
+        return self._data[:self._size]
+
+    @property
+    def iterations(self):
+        """
+        Iteration number of each recorded row.
+        """
+        return self._iterations[:self._size]
+
+    @property
+    def labels(self):
+        """
+        Labels of the tracked states, in column order (integer indices when no labels were given).
+        """
+        if self.state_labels is None:
+            return self.tracked.tolist()
+        return [self.state_labels[i] for i in self.tracked]
+
+    def column(self, state):
+        """
+        Trajectory of one tracked state, given as a label or an integer state index.
+        """
+        if self.state_labels is not None and not isinstance(state, (int, np.integer)):
+            state = self.state_labels.index(state)
+        return self.values[:, int(np.flatnonzero(self.tracked == state)[0])]
+
+    def max_changes(self):
+        """
+        Max absolute change over the tracked states between consecutive recorded rows.
+        """
+        return np.abs(np.diff(self.values, axis=0)).max(axis=1)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, row):
+        """
+        One recorded row as a {state: value} dictionary, matching the older list-of-dicts history format.
+        """
+        return dict(zip(self.labels, self.values[row].tolist()))
+
+
+def recordHistory(track_history, num_states, state_labels=None):
+    """
+    Resolve a solver's track_history argument: True creates a default recorder, a ValueHistory is used as given
+    and False or None disables recording.
+    """
+    if isinstance(track_history, ValueHistory):
+        return track_history
+    if track_history:
+        return ValueHistory(num_states, state_labels=state_labels)
+    return None
@@ -4,6 +4,19 @@ Value Iteration
 
 """
 
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from MDP import MDP
+from bellman import (bellmanBackup, bellmanResidual, predecessorGraph, qTable, stateBackupFunction, stoppingThreshold,
+                     terminalValues)
+from solveCache import cachedSolution, resolveCache, solveKey, storeSolution
+from solverObservers import notifyObservers
+from solverProfiling import count, nameStats, phase
+from valueHistory import recordHistory
+from warmStart import initialValues, iterationsSaved
+
 """
 State-Value Computation using Bellman Optimality Equation
 
@@ -99,54 +112,608 @@ def extractPolicy(V, transition_matrix, reward_matrix, actions, gamma, states):
 Value Iteration Algorithm
 
     compute the optimal value function and, subsequently the optimal policy for a MDP.
-    It iteratively updates the value function until it converges and then extracts the policy based on that "converged" value function
+    It iteratively updates the value function until it converges. Each sweep computes the whole Q-table in one step,
+    so the greedy policy comes from the same computation as the last update instead of a second extraction pass.
 
     Pseudo Code:
         Function ValueIteration(states, actions, transition_probs, rewards, gamma, eps):
         Initialize V for each state to 0
         Repeat:
-            new_V = V.copy()
-            For each state:
-                Update new_V[state] using Bellman Optimality Equation
+            Q = R + gamma * P @ V
+            new_V = max of Q over actions, policy = argmax of Q over actions
             If max change between new_V and V < eps:
                 Break
             V = new_V
-        Extract policy based on V using the policy extraction method
         Return V, policy
 """
 
-def valueIteration(states, actions, transition_matrix, reward_matrix, gamma=0.9, theta=1e-3, track_history=False):
-    V = {state: 0 for state in states}
+def _pinTerminalStates(V, R, gamma, terminal_mask):
+    # terminal states keep their closed-form value; every action stays put, so the best reward is the greedy action
+    policy = np.zeros(R.shape[0], dtype=np.intp)
+    if terminal_mask is not None and np.any(terminal_mask):
+        V[terminal_mask] = terminalValues(R, terminal_mask, gamma)
+        policy[terminal_mask] = R[terminal_mask].argmax(axis=1)
+    return policy
+
+def batchedValueIteration(P, R, gamma=0.9, theta=1e-3, track_history=False, stopping="delta", observers=None,
+                          initial_values=None, terminal_mask=None, stats=None, budget=None, return_iterations=False):
+    """
+    Value iteration over the array form of an MDP (see MDP.P and MDP.R).
+
+    stopping="epsilon" tightens the convergence test to theta*(1-gamma)/(2*gamma) so that the returned
+    policy is theta-optimal (see bellman.stoppingThreshold). observers are called after every sweep
+    (see solverObservers). initial_values warm-starts the sweeps from an earlier V instead of from 0.
+    terminal_mask (e.g. MDP.terminal_mask) pins those states' values and leaves them out of every sweep
+    (see bellman.terminalValues). stats (a solverProfiling.SolverStats) records per-phase timings and counts.
+    budget (a solveBudget.SolveBudget) stops the sweeps early once it runs out and receives the policy's
+    suboptimality bound; the last sweep's delta is the exact residual, so the bound costs nothing extra.
+
+    Returns V as a length-S array and the policy as a length-S array of action indices, followed by the value
+    history and the number of sweeps when track_history is set or return_iterations is True (the history is then
+    None without track_history).
+    """
+    nameStats(stats, "value_iteration")
+    if budget is not None:
+        budget.start()
+    V = np.zeros(R.shape[0]) if initial_values is None else np.array(initial_values, dtype=np.float64)
+    policy = _pinTerminalStates(V, R, gamma, terminal_mask)
+    threshold = stoppingThreshold(theta, gamma, stopping)
+    iteration = 0
+    value_history = recordHistory(track_history, R.shape[0])
+    if value_history is not None:
+        with phase(stats, "history"):
+            value_history.record(0, V)
+
+    has_terminal = terminal_mask is not None and np.any(terminal_mask)
+    if has_terminal:
+        terminal_values, terminal_policy = V[terminal_mask], policy[terminal_mask]
+    num_active = R.shape[0] - (int(np.count_nonzero(terminal_mask)) if has_terminal else 0)
+
+    while True:
+        # a sweep only starts if all of its backups fit in the budget
+        if budget is not None and not budget.allows(num_active):
+            if iteration == 0:
+                # stopped before the first sweep: the bound's residual needs one backup of the starting V
+                delta, policy = bellmanResidual(P, R, V, gamma, terminal_mask)
+            break
+
+        # back up every state at once and take the greedy policy from the same Q-table
+        with phase(stats, "backup"):
+            new_V, policy = bellmanBackup(P, R, V, gamma)
+            if has_terminal:
+                new_V[terminal_mask], policy[terminal_mask] = terminal_values, terminal_policy
+            delta = np.max(np.abs(new_V - V), initial=0)
+
+        iteration += 1
+        V = new_V
+        count(stats, "backups", num_active)
+        count(stats, "sweeps")
+        count(stats, "iterations")
+
+        if value_history is not None:
+            with phase(stats, "history"):
+                value_history.record(iteration, V)
+
+        notifyObservers(observers, "Value Iteration", iteration, delta, V)
+
+        #Check Convergence
+        if delta < threshold or (budget is not None and budget.spend(num_active)):
+            break
+
+    if budget is not None:
+        # the policy is greedy with respect to the V before the last sweep, whose residual is that sweep's delta
+        budget.finish(delta, gamma, delta < threshold)
+
+    if value_history is not None:
+        with phase(stats, "history"):
+            value_history.finish(iteration, V)
+    if value_history is not None or return_iterations:
+        return V, policy, value_history, iteration
+    return V, policy
+
+"""
+In-place (Gauss-Seidel) Value Iteration
+
+    updates V state by state, so later states in a sweep already see the new values of earlier ones.
+    no copy of V is made and convergence typically needs fewer sweeps than the synchronous version.
+
+    order: state indices in the order they are backed up each sweep (default 0..S-1), or a callable
+           taking the sweep number and returning that order, for schedules that change between sweeps
+    initial_values: optional V to warm-start from (copied, not updated in place)
+    terminal_mask: optional boolean mask of states whose values are pinned and that are never backed up
+    stats: optional solverProfiling.SolverStats recording per-phase timings and counts
+    budget: optional solveBudget.SolveBudget; the sweep stops at the backup that exhausts it, and the returned
+            policy is then the greedy policy of the final V, found by one synchronous backup that also measures
+            the residual behind the budget's bound
+    return_iterations: also return the value history (None without track_history) and the number of sweeps,
+                       as batchedValueIteration does
+"""
+
+def gaussSeidelValueIteration(P, R, gamma=0.9, theta=1e-3, order=None, track_history=False, stopping="delta",
+                              observers=None, initial_values=None, terminal_mask=None, stats=None, budget=None,
+                              return_iterations=False):
+    nameStats(stats, "gauss_seidel_value_iteration")
+    if budget is not None:
+        budget.start()
+    num_states = R.shape[0]
+    backup = stateBackupFunction(P, R, gamma)
+
+    V = np.zeros(num_states) if initial_values is None else np.array(initial_values, dtype=np.float64)
+    policy = _pinTerminalStates(V, R, gamma, terminal_mask)
+    skip = terminal_mask if terminal_mask is not None else np.zeros(num_states, dtype=bool)
+    threshold = stoppingThreshold(theta, gamma, stopping)
     iteration = 0
-    value_history = [V.copy()] if track_history else None
+    value_history = recordHistory(track_history, R.shape[0])
+    if value_history is not None:
+        with phase(stats, "history"):
+            value_history.record(0, V)
 
     while True:
-        new_V = V.copy()
+        sweep_order = order(iteration) if callable(order) else (range(num_states) if order is None else order)
         delta = 0
+        sweep_backups = 0
+
+        with phase(stats, "backup"):
+            for state in sweep_order:
+                if skip[state]:
+                    continue
+                value, policy[state] = backup(V, state)
+                delta = max(delta, abs(value - V[state]))
+                V[state] = value
+                sweep_backups += 1
+                if budget is not None and budget.spend():
+                    break
 
-        # Compute State-value function
-        for state in states:
-            new_V[state] = computeStateValue(state, V, transition_matrix, reward_matrix, actions, gamma, states)
-            delta = max(delta, abs(new_V[state] - V[state]))
-        
         iteration += 1
-        
-        if track_history:
-            value_history.append(new_V.copy())
-            
-        print(f"Value Iteration {iteration}: Value Function: {new_V}")
-        print(f"Value Iteration {iteration}: Delta: {delta}\n")
-        
-        #Check Convergence 
-        if delta < theta:
+        count(stats, "backups", sweep_backups)
+        count(stats, "sweeps")
+        count(stats, "iterations")
+
+        if value_history is not None:
+            with phase(stats, "history"):
+                value_history.record(iteration, V)
+
+        notifyObservers(observers, "Gauss-Seidel Value Iteration", iteration, delta, V)
+
+        #Check Convergence
+        if delta < threshold or (budget is not None and budget.exhausted):
             break
 
-        V = new_V
-    
-    # extract policy from state-value function
-    policy = extractPolicy(V, transition_matrix, reward_matrix, actions, gamma, states)
+    if budget is not None:
+        # in-place changes don't bound the residual of the final V, so measure it
+        with phase(stats, "extraction"):
+            residual, policy = bellmanResidual(P, R, V, gamma, terminal_mask)
+        budget.finish(residual, gamma, delta < threshold and not budget.exhausted)
 
-    if track_history:
+    if value_history is not None:
+        with phase(stats, "history"):
+            value_history.finish(iteration, V)
+    if value_history is not None or return_iterations:
         return V, policy, value_history, iteration
-    else:
-        return V, policy
+    return V, policy
+
+"""
+Prioritized Sweeping
+
+    backs up states in order of their Bellman residual instead of sweeping over all of them.
+    priority[s] is an upper bound on the residual of s; after backing up s by a change of c, every
+    predecessor p of s has its bound raised by gamma * max_a P[p, a, s] * c and is queued once that bound
+    reaches the threshold. a max-heap keyed on the bound decides the order; a queued state is pushed again
+    (and its old entry skipped when popped) only once its bound has doubled. when the heap is empty every
+    residual is below the threshold.
+
+    Pseudo Code:
+        priority = |T V - V| for every state (one synchronous backup)
+        push every state with priority >= threshold
+        While heap is not empty:
+            pop the state s with highest priority
+            back up s in place, priority[s] = 0
+            For each predecessor p of s:
+                priority[p] += gamma * weight(p, s) * change in V[s]
+                If priority[p] >= threshold and p is not already queued at half that priority or more: push p
+        Return V and the greedy policy
+"""
+
+def prioritizedSweeping(P, R, gamma=0.9, theta=1e-3, stopping="delta", max_backups=None, observers=None,
+                        initial_values=None, terminal_mask=None, stats=None, budget=None):
+    """
+    Returns V, the greedy policy (array of action indices) and the number of single-state backups performed.
+
+    observers are called once per S backups, with the largest residual bound as delta. initial_values
+    warm-starts from an earlier V; only states whose residual against it reaches the threshold get queued.
+    states in terminal_mask have their values pinned and are never queued. stats (a solverProfiling.SolverStats)
+    records the time spent backing up and extracting the policy, and the number of backups. budget (a
+    solveBudget.SolveBudget) stops the sweeping once it runs out, checked after every backup; the final policy
+    extraction measures the residual behind its bound.
+    """
+    nameStats(stats, "prioritized_sweeping")
+    if budget is not None:
+        budget.start()
+    num_states = R.shape[0]
+    backup = stateBackupFunction(P, R, gamma)
+    predecessors = predecessorGraph(P, R.shape[1])
+    if terminal_mask is not None and np.any(terminal_mask):
+        # drop terminal states as predecessors, so no change ever raises their priority
+        predecessors = sp.csr_matrix(predecessors @ sp.diags((~terminal_mask).astype(np.float64)))
+        predecessors.eliminate_zeros()
+    predecessor_indptr, predecessor_indices = predecessors.indptr, predecessors.indices
+    predecessor_weights = gamma * predecessors.data
+    threshold = stoppingThreshold(theta, gamma, stopping)
+
+    # seed every state's priority with its exact residual
+    V = np.zeros(num_states) if initial_values is None else np.array(initial_values, dtype=np.float64)
+    _pinTerminalStates(V, R, gamma, terminal_mask)
+    seed_V, _ = bellmanBackup(P, R, V, gamma)
+    priority = np.abs(seed_V - V)
+    backups = num_states
+    if terminal_mask is not None:
+        priority[terminal_mask] = 0
+    # the seeding residuals are one backup per state, and count against the budget like any other
+    exhausted = budget is not None and budget.spend(num_states)
+
+    with phase(stats, "backup"):
+        # heap entries hold python floats and ints, which compare much faster than numpy scalars
+        heap = [(-float(priority[state]), state) for state in np.flatnonzero(priority >= threshold).tolist()]
+        heapq.heapify(heap)
+
+        # priority each state was last pushed with (0 when not queued); a queued state is only pushed again once
+        # its bound has doubled, which keeps the heap small while ordering states to within a factor of two
+        queued_priority = np.zeros(num_states)
+        queued_priority[priority >= threshold] = priority[priority >= threshold]
+
+        while heap and not exhausted and (max_backups is None or backups < max_backups):
+            negative_priority, state = heapq.heappop(heap)
+
+            # skip entries superseded by a later push for the same state
+            if -negative_priority != queued_priority[state]:
+                continue
+            queued_priority[state] = 0
+
+            value, _ = backup(V, state)
+            change = abs(value - V[state])
+            V[state] = value
+            priority[state] = 0
+            backups += 1
+
+            if observers and backups % num_states == 0:
+                notifyObservers(observers, "Prioritized Sweeping", backups // num_states, priority.max(), V)
+
+            # raise the residual bound of every state that can reach this one
+            start, end = predecessor_indptr[state], predecessor_indptr[state + 1]
+            predecessor_states = predecessor_indices[start:end]
+            predecessor_priority = priority[predecessor_states] + predecessor_weights[start:end] * change
+            priority[predecessor_states] = predecessor_priority
+
+            requeue = ((predecessor_priority >= threshold)
+                       & (predecessor_priority >= 2 * queued_priority[predecessor_states]))
+            for predecessor, new_priority in zip(predecessor_states[requeue].tolist(),
+                                                 predecessor_priority[requeue].tolist()):
+                queued_priority[predecessor] = new_priority
+                heapq.heappush(heap, (-new_priority, predecessor))
+
+            # checked once the predecessors are queued, so whatever is left to do stays in queued_priority
+            if budget is not None and budget.spend():
+                break
+
+    count(stats, "backups", backups)
+    count(stats, "iterations", -(-backups // num_states))
+
+    # greedy policy with respect to the final V
+    with phase(stats, "extraction"):
+        residual, policy = bellmanResidual(P, R, V, gamma, terminal_mask)
+    if budget is not None:
+        # converged only if no state is still queued; stopping at max_backups or on the budget leaves some behind
+        budget.finish(residual, gamma, not np.any(queued_priority))
+
+    return V, policy, backups
+
+"""
+Incremental Value Iteration
+
+    re-solves after a few (state, action) rows of P or R were edited, starting from the V that was converged
+    before the edit. only the edited states can have a residual above the threshold at first, so only they are
+    backed up in the first round. every later round backs up just the frontier: states whose residual bound,
+    raised by gamma * max_a P[p, a, s] * (change in V[s]) for each successor s (see bellman.predecessorGraph),
+    has reached the threshold. each round is one batched backup over the frontier's rows of P, and states
+    outside the region the edit reaches are never backed up.
+
+    one synchronous backup at the end gives the new greedy policy, and the states whose greedy action differs
+    from the old policy are returned as the diff.
+"""
+
+def incrementalValueIteration(P, R, V, policy, changed_states, gamma=0.9, theta=1e-3, stopping="delta",
+                              max_backups=None, predecessors=None, terminal_mask=None):
+    """
+    Parameters:
+    - P, R: The edited model
+    - V, policy: Converged values and greedy policy of the model before the edit
+    - changed_states: Indices of the states with edited rows (see MDP.update_rows)
+    - max_backups: Optional cap on the number of single-state backups
+    - predecessors: Optional predecessorGraph of the edited P, to reuse across several updates
+    - terminal_mask: Optional boolean mask of terminal states, whose values are re-pinned rather than backed up
+
+    Returns the new V, the new policy, the indices of states whose greedy action changed and the number of
+    single-state backups performed.
+    """
+    num_states, num_actions = R.shape
+    if predecessors is None:
+        predecessors = predecessorGraph(P, num_actions)
+    P_rows = P if sp.issparse(P) else P.reshape(num_states * num_actions, num_states)
+    threshold = stoppingThreshold(theta, gamma, stopping)
+
+    V = np.array(V, dtype=np.float64)
+    priority = np.zeros(num_states)
+    backups = 0
+
+    backed_up = np.ones(num_states, dtype=bool)
+    if terminal_mask is not None and np.any(terminal_mask):
+        # an edited reward can move a pinned value, which raises its predecessors' priorities like any other change
+        terminal = np.flatnonzero(terminal_mask)
+        pinned = terminalValues(R, terminal_mask, gamma)
+        priority += gamma * (predecessors[terminal].T @ np.abs(pinned - V[terminal]))
+        V[terminal] = pinned
+        backed_up = ~terminal_mask
+
+    frontier = np.unique(np.concatenate((np.asarray(changed_states, dtype=np.intp),
+                                         np.flatnonzero(priority >= threshold))))
+    frontier = frontier[backed_up[frontier]]
+
+    while frontier.size and (max_backups is None or backups < max_backups):
+        # batched backup of the frontier's (state, action) rows only
+        rows = (frontier[:, None] * num_actions + np.arange(num_actions)).ravel()
+        Q = R[frontier] + gamma * (P_rows[rows] @ V).reshape(frontier.size, num_actions)
+        new_values = Q.max(axis=1)
+        change = np.abs(new_values - V[frontier])
+
+        V[frontier] = new_values
+        priority[frontier] = 0
+        backups += frontier.size
+
+        # raise the residual bound of every predecessor of a state that moved
+        moved = frontier[change > 0]
+        priority += gamma * (predecessors[moved].T @ change[change > 0])
+        frontier = np.flatnonzero((priority >= threshold) & backed_up)
+
+    # greedy policy with respect to the final V
+    _, new_policy = bellmanBackup(P, R, V, gamma)
+
+    return V, new_policy, np.flatnonzero(new_policy != np.asarray(policy)), backups
+
+def updateValueIteration(mdp, V, policy, changed_rows, gamma=0.9, theta=1e-3, stopping="delta"):
+    """
+    Labelled version of incrementalValueIteration for an MDP edited with MDP.update_rows.
+
+    Parameters:
+    - mdp: The edited MDP
+    - V, policy: {state: value} and {state: action} dictionaries solved before the edit
+    - changed_rows: (state, action) pairs that were edited, e.g. the return value of MDP.update_rows
+
+    Returns:
+    - V, policy: Updated dictionaries
+    - diff: {state: (old action, new action)} for every state whose greedy action changed
+    """
+    V = np.array([V[state] for state in mdp.state_labels], dtype=np.float64)
+    old_policy = np.array([mdp.action_index[policy[state]] for state in mdp.state_labels])
+    changed_states = [mdp.state_index[state] for state, _ in changed_rows]
+
+    V, new_policy, changed, _ = incrementalValueIteration(mdp.P, mdp.R, V, old_policy, changed_states, gamma, theta,
+                                                          stopping, terminal_mask=mdp.terminal_mask)
+
+    diff = {mdp.state_labels[i]: (mdp.action_labels[old_policy[i]], mdp.action_labels[new_policy[i]])
+            for i in changed.tolist()}
+    return mdp.label_values(V), mdp.label_policy(new_policy), diff
+
+"""
+Parameter Sweeps
+
+    solves K variants of one transition model at once, each with its own discount factor, threshold and/or
+    reward matrix. V is a (K, S) array and every sweep backs up all unconverged variants with one matrix
+    product P @ V.T over the (S*A, S) form of P. a variant stops being updated once it converges, so its V,
+    policy and iteration count are those of a separate batchedValueIteration run with the same terminal_mask.
+
+    with num_workers set, each variant is instead solved by batchedValueIteration on a process pool, without a
+    value history, so each worker only holds one variant's V and its (S, A) Q-table of the current sweep rather
+    than the (K, S) values, for when K * S is too large to hold at once.
+"""
+
+def _solveVariant(P, R, gamma, theta, stopping, terminal_mask):
+    V, policy, _, iteration = batchedValueIteration(P, R, gamma, theta, False, stopping, terminal_mask=terminal_mask,
+                                                    return_iterations=True)
+    return V, policy, iteration
+
+def sweepValueIteration(P, R, gammas=0.9, thetas=1e-3, stopping="delta", num_workers=None, terminal_mask=None):
+    """
+    Value iteration for K variants of an MDP sharing the transition model P.
+
+    Parameters:
+    - P: Transition model (see MDP.P)
+    - R: (S, A) reward array shared by all variants, or a (K, S, A) stack with one reward array per variant
+    - gammas, thetas: Scalars shared by all variants, or length-K arrays
+    - stopping: Stopping rule (see bellman.stoppingThreshold)
+    - num_workers: If given, solve the variants one by one on this many worker processes instead
+    - terminal_mask: Optional boolean mask of terminal states, pinned in every variant (see MDP.terminal_mask)
+
+    Returns:
+    - V as a (K, S) array, the policies as a (K, S) array of action indices and a length-K array of iteration counts
+    """
+    R = np.asarray(R, dtype=np.float64)
+    num_variants = max(np.size(gammas), np.size(thetas), R.shape[0] if R.ndim == 3 else 1)
+    gammas = np.broadcast_to(np.asarray(gammas, dtype=np.float64), (num_variants,))
+    thetas = np.broadcast_to(np.asarray(thetas, dtype=np.float64), (num_variants,))
+    R = np.broadcast_to(R, (num_variants,) + R.shape[-2:])
+    num_states, num_actions = R.shape[1:]
+
+    if num_workers is not None:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_solveVariant, [P] * num_variants, R, gammas, thetas,
+                                        [stopping] * num_variants, [terminal_mask] * num_variants))
+        V, policies, iterations = zip(*results)
+        return np.array(V), np.array(policies), np.array(iterations)
+
+    P_rows = P if sp.issparse(P) else P.reshape(num_states * num_actions, num_states)
+    thresholds = np.array([stoppingThreshold(theta, gamma, stopping) for theta, gamma in zip(thetas, gammas)])
+
+    V = np.zeros((num_variants, num_states))
+    policies = np.zeros((num_variants, num_states), dtype=np.intp)
+    iterations = np.zeros(num_variants, dtype=np.int64)
+    active = np.arange(num_variants)
+
+    # every variant pins its terminal states to their values under its own gamma and rewards
+    has_terminal = terminal_mask is not None and np.any(terminal_mask)
+    if has_terminal:
+        terminal = np.flatnonzero(terminal_mask)
+        for k in range(num_variants):
+            policies[k] = _pinTerminalStates(V[k], R[k], gammas[k], terminal_mask)
+        terminal_V, terminal_policies = V[:, terminal], policies[:, terminal]
+
+    while active.size:
+        # Q[k, s, a] = R[k, s, a] + gamma[k] * sum over s' of P[s, a, s'] * V[k, s'] for the active variants
+        expected_next_values = np.asarray(P_rows @ V[active].T).T.reshape(active.size, num_states, num_actions)
+        Q = R[active] + gammas[active, None, None] * expected_next_values
+
+        policies[active] = Q.argmax(axis=2)
+        new_V = np.take_along_axis(Q, policies[active][:, :, None], axis=2)[:, :, 0]
+        if has_terminal:
+            new_V[:, terminal] = terminal_V[active]
+            policies[np.ix_(active, terminal)] = terminal_policies[active]
+        deltas = np.max(np.abs(new_V - V[active]), axis=1)
+
+        V[active] = new_V
+        iterations[active] += 1
+        active = active[deltas >= thresholds[active]]
+
+    return V, policies, iterations
+
+def valueIterationSweep(states, actions, transition_matrix, reward_matrices, gammas=0.9, theta=1e-3, stopping="delta",
+                        num_workers=None, terminal_states=None):
+    """
+    Solve the dictionary form of an MDP for several discount factors and/or reward variants (see sweepValueIteration).
+
+    Parameters:
+    - reward_matrices: One reward dictionary shared by all variants, or a list of reward dictionaries
+    - gammas: One discount factor, or a list with one per variant
+    - terminal_states: States whose values are pinned (defaults to the absorbing states, see MDP.terminal_mask)
+
+    Returns:
+    - List with one (V, policy, iterations) tuple per variant, V and policy as dictionaries keyed by state
+    """
+    if isinstance(reward_matrices, dict):
+        reward_matrices = [reward_matrices]
+
+    # the transitions are compiled once; further reward variants only need their (S, A) arrays
+    mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrices[0], terminal_states=terminal_states)
+    action_mask = mdp.action_mask
+    R = np.array([[[rewards[s][a] if action_mask[i, j] else -np.inf for j, a in enumerate(mdp.action_labels)]
+                   for i, s in enumerate(mdp.state_labels)] for rewards in reward_matrices])
+
+    V, policies, iterations = sweepValueIteration(mdp.P, R, gammas, theta, stopping, num_workers, mdp.terminal_mask)
+
+    return [(mdp.label_values(V[k]), mdp.label_policy(policies[k]), int(iterations[k])) for k in range(len(V))]
+
+def _labelledReturns(mdp, result, return_report, cached=False, stats=None, return_q=False):
+    # the dictionary solvers' return tuple from (V array, policy array, value history, iterations)
+    V, policy, value_history, iterations = result
+    with phase(stats, "extraction"):
+        returns = (mdp.label_values(V), mdp.label_policy(policy))
+        if value_history is not None:
+            returns += (value_history, iterations)
+        if return_q:
+            returns += (qTable(mdp.P, mdp.R, V, mdp.discount_factor, mdp.terminal_mask),)
+    if return_report:
+        returns += ({"iterations": iterations, "warm_start": False, "iterations_saved": 0, "cached": cached},)
+    return returns
+
+def _solveSchedule(mdp, schedule, gamma, theta, state_order, value_history, stopping, observers, V0, stats, budget):
+    # (V, policy, value history or None, iterations) of one schedule on the compiled model
+    terminal_mask = mdp.terminal_mask
+    if schedule == "jacobi":
+        return batchedValueIteration(mdp.P, mdp.R, gamma, theta, value_history, stopping, observers, V0,
+                                     terminal_mask, stats, budget, return_iterations=True)
+    if schedule == "gauss-seidel":
+        return gaussSeidelValueIteration(mdp.P, mdp.R, gamma, theta, state_order, value_history, stopping, observers,
+                                         V0, terminal_mask, stats, budget, return_iterations=True)
+    if schedule == "prioritized":
+        V, policy, backups = prioritizedSweeping(mdp.P, mdp.R, gamma, theta, stopping, observers=observers,
+                                                 initial_values=V0, terminal_mask=terminal_mask, stats=stats,
+                                                 budget=budget)
+        # prioritized sweeping has no sweeps of its own, so history holds just the start and end points
+        # and the iteration count is the number of backups expressed in full sweeps
+        iteration = -(-backups // mdp.num_states)
+        if value_history is not None:
+            value_history.record(0, np.zeros(mdp.num_states) if V0 is None else V0)
+            value_history.finish(iteration, V)
+        return V, policy, value_history, iteration
+    raise ValueError(f"Unknown value iteration schedule {schedule!r}")
+
+def valueIteration(states, actions, transition_matrix, reward_matrix, gamma=0.9, theta=1e-3, track_history=False,
+                   stopping="delta", schedule="jacobi", order=None, observers=None, initial_values=None,
+                   return_report=False, terminal_states=None, cache=None, stats=None, budget=None,
+                   return_q=False, cold_iterations=None):
+    """
+    Value iteration on the dictionary form of an MDP (see MDP.convert_to_dictionary).
+
+    Parameters:
+    - schedule: "jacobi" (synchronous sweeps), "gauss-seidel" (in-place sweeps) or "prioritized" (prioritized sweeping)
+    - order: For "gauss-seidel", the states in the order they are backed up each sweep
+    - observers: Callables notified after every iteration (see solverObservers); the solver prints nothing itself
+    - initial_values: Warm start from an earlier V, as a {state: value} dictionary or a saveSolution file
+                      (see warmStart)
+    - return_report: If True, also return a report with the number of "iterations" taken, whether the solve was
+                     warm-started and the "iterations_saved" by the warm start (0 for a cold solve, None when no
+                     cold count is known or the solve had a budget, see cold_iterations)
+    - terminal_states: States whose values are pinned rather than backed up (defaults to the absorbing states,
+                       see MDP.terminal_mask)
+    - cache: A SolveCache, or True for the default one (see solveCache). an identical earlier solve is returned
+             without sweeping; runs with observers, a warm start, a callable order, a budget or a custom
+             ValueHistory are never cached
+    - stats: Optional solverProfiling.SolverStats recording per-phase timings and backup/sweep counts
+    - budget: Optional solveBudget.SolveBudget (time and/or backup limit). the solve stops once it runs out and
+              returns the greedy policy so far; the budget then holds its suboptimality bound
+    - return_q: If True, also return the (S, A) Q-table of the returned V (see bellman.qTable), after the history
+                and before the report. rows follow states and columns the actions in order of first appearance
+                (-inf where a state doesn't offer one, see MDP.from_dictionary); see compiledPolicy for fast lookups
+    - cold_iterations: Iteration count of a cold solve of the same model, for the report's "iterations_saved"
+                       of a warm-started solve, or True to run that cold solve (which costs more than the warm
+                       start saves)
+    """
+    nameStats(stats, "value_iteration")
+    # compile the dictionaries into P and R arrays once rather than looking them up on every sweep
+    with phase(stats, "compile"):
+        mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrix, gamma,
+                                  terminal_states=terminal_states)
+    terminal_mask = mdp.terminal_mask
+    value_history = recordHistory(track_history, mdp.num_states, mdp.state_labels)
+    V0 = initialValues(mdp, initial_values)
+    state_order = order
+    if order is not None and not callable(order):
+        state_order = [mdp.state_index[state] for state in order]
+
+    cache = resolveCache(cache)
+    if observers or V0 is not None or callable(order) or budget is not None or not isinstance(track_history, bool):
+        cache = None
+    if cache is not None:
+        key = solveKey(mdp.P, mdp.R, gamma, theta, "value_iteration", terminal_mask, stopping=stopping,
+                       schedule=schedule, order=state_order)
+        cached = cachedSolution(cache, key, mdp, track_history)
+        if cached is not None:
+            count(stats, "cache_hits")
+            return _labelledReturns(mdp, cached, return_report, cached=True, stats=stats, return_q=return_q)
+
+    result = _solveSchedule(mdp, schedule, gamma, theta, state_order, value_history, stopping, observers, V0, stats,
+                            budget)
+    iterations = result[3]
+    if cache is not None:
+        storeSolution(cache, key, result[0], result[1], iterations, value_history)
+    returns = _labelledReturns(mdp, (result[0], result[1], value_history, iterations), False, stats=stats,
+                               return_q=return_q)
+
+    if not return_report:
+        return returns
+
+    iterations_saved = iterationsSaved(V0 is not None, iterations, cold_iterations, budget,
+                                       lambda: _solveSchedule(mdp, schedule, gamma, theta, state_order, None,
+                                                              stopping, None, None, None, None)[3])
+
+    report = {"iterations": iterations, "warm_start": V0 is not None, "iterations_saved": iterations_saved,
+              "cached": False}
+    return returns + (report,)
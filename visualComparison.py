@@ -7,21 +7,52 @@ import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
+from MDP import MDP
 from policyIteration import policyIteration
+from solverProfiling import SolverStats
 from valueIteration import valueIteration
+from valueHistory import ValueHistory
 
-def plot_value_evolution(pi_history, vi_history, states, save_path=None):
+def _as_value_history(history, states):
+    """
+    Accept either a ValueHistory or the older list of {state: value} dictionaries.
+    """
+    if isinstance(history, ValueHistory):
+        return history
+
+    value_history = ValueHistory(len(states), capacity=max(len(history), 1), state_labels=states)
+    for iteration, v_func in enumerate(history):
+        value_history.record(iteration, np.array([v_func[state] for state in states]))
+    return value_history
+
+def _non_terminal_states(states, terminal_states):
+    """
+    The states to plot: all of them but terminal_states, given as labels or as a boolean mask over states
+    (e.g. MDP.terminal_mask).
+    """
+    if terminal_states is None:
+        return list(states)
+    if isinstance(terminal_states, np.ndarray) and terminal_states.dtype == bool:
+        return [s for s, terminal in zip(states, terminal_states) if not terminal]
+    return [s for s in states if s not in terminal_states]
+
+def plot_value_evolution(pi_history, vi_history, states, save_path=None, terminal_states=None):
     """
     Plot the evolution of state values during iterations for both algorithms.
     
     Parameters:
-    - pi_history: Value function history from Policy Iteration
-    - vi_history: Value function history from Value Iteration
+    - pi_history: Value function history (ValueHistory) from Policy Iteration
+    - vi_history: Value function history (ValueHistory) from Value Iteration
     - states: List of states
     - save_path: Optional path to save the plot
+    - terminal_states: States left out of the plot since their values are fixed, as labels or as the model's
+                       MDP.terminal_mask (default: plot every state)
     """
+    pi_history = _as_value_history(pi_history, states)
+    vi_history = _as_value_history(vi_history, states)
+
     # Filter out terminal states for cleaner visualization
-    non_terminal_states = [s for s in states if s not in ['Destination Reached', 'Acident']]
+    non_terminal_states = _non_terminal_states(states, terminal_states)
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     
@@ -32,8 +63,7 @@ def plot_value_evolution(pi_history, vi_history, states, save_path=None):
     ax1.grid(True, alpha=0.3)
     
     for state in non_terminal_states:
-        values = [v_func[state] for v_func in pi_history]
-        ax1.plot(range(len(values)), values, marker='o', linewidth=2, label=state)
+        ax1.plot(pi_history.iterations, pi_history.column(state), marker='o', linewidth=2, label=state)
     
     ax1.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     
@@ -44,8 +74,7 @@ def plot_value_evolution(pi_history, vi_history, states, save_path=None):
     ax2.grid(True, alpha=0.3)
     
     for state in non_terminal_states:
-        values = [v_func[state] for v_func in vi_history]
-        ax2.plot(range(len(values)), values, marker='o', linewidth=2, label=state)
+        ax2.plot(vi_history.iterations, vi_history.column(state), marker='o', linewidth=2, label=state)
     
     ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     
@@ -61,20 +90,16 @@ def plot_convergence_comparison(pi_history, vi_history, states, save_path=None):
     """
     Plot convergence speed comparison between algorithms.
     """
-    # Calculate maximum change per iteration
-    pi_deltas = []
-    for i in range(1, len(pi_history)):
-        max_delta = max(abs(pi_history[i][state] - pi_history[i-1][state]) for state in states)
-        pi_deltas.append(max_delta)
-    
-    vi_deltas = []
-    for i in range(1, len(vi_history)):
-        max_delta = max(abs(vi_history[i][state] - vi_history[i-1][state]) for state in states)
-        vi_deltas.append(max_delta)
+    pi_history = _as_value_history(pi_history, states)
+    vi_history = _as_value_history(vi_history, states)
+
+    # Calculate maximum change between consecutive recorded iterations
+    pi_deltas = pi_history.max_changes()
+    vi_deltas = vi_history.max_changes()
     
     plt.figure(figsize=(10, 6))
-    plt.semilogy(range(1, len(pi_deltas) + 1), pi_deltas, 'b-o', linewidth=2, label='Policy Iteration', markersize=6)
-    plt.semilogy(range(1, len(vi_deltas) + 1), vi_deltas, 'r-s', linewidth=2, label='Value Iteration', markersize=4)
+    plt.semilogy(pi_history.iterations[1:], pi_deltas, 'b-o', linewidth=2, label='Policy Iteration', markersize=6)
+    plt.semilogy(vi_history.iterations[1:], vi_deltas, 'r-s', linewidth=2, label='Value Iteration', markersize=4)
     
     plt.title('Convergence Speed Comparison', fontsize=14, fontweight='bold')
     plt.xlabel('Iteration')
@@ -89,27 +114,39 @@ def plot_convergence_comparison(pi_history, vi_history, states, save_path=None):
     plt.close()  # Close instead of show
 
 def visual_algorithm_comparison(states, actions, transition_matrix, reward_matrix, 
-                              start_state='Clear Road', gamma=0.9, theta=1e-3, save_plots=False):
+                              start_state='Clear Road', gamma=0.9, theta=1e-3, save_plots=False,
+                              terminal_states=None, cache=None, profile=False):
     """
     Complete visual comparison of algorithms with multiple plots.
     
     Parameters:
     - save_plots: If True, saves plots to files
+    - terminal_states: Terminal states, pinned by the solvers and left out of the value plots
+                       (defaults to the absorbing states, see MDP.terminal_mask)
+    - cache: Optional SolveCache, or True for the default one; cached solves report their lookup time
+    - profile: If True, each algorithm's results include "stats", a SolverStats with per-phase timings and counts
     """
-   
+    mdp = MDP.from_dictionary(states, actions, transition_matrix, reward_matrix, gamma,
+                              terminal_states=terminal_states)
+    terminal_states = [s for s, terminal in zip(mdp.state_labels, mdp.terminal_mask) if terminal]
+    pi_stats = SolverStats() if profile else None
+    vi_stats = SolverStats() if profile else None
+
     # Run algorithms with history tracking
-    start_time = time.time()
+    start_time = time.perf_counter()
     pi_values, pi_policy, pi_history, pi_iterations = policyIteration(
-        states, actions, transition_matrix, reward_matrix, gamma, theta, track_history=True
+        states, actions, transition_matrix, reward_matrix, gamma, theta, track_history=True,
+        terminal_states=terminal_states, cache=cache, stats=pi_stats
     )
-    pi_time = time.time() - start_time
+    pi_time = time.perf_counter() - start_time
     
     print("🎯 Value Iteration with tracking...")
-    start_time = time.time()
+    start_time = time.perf_counter()
     vi_values, vi_policy, vi_history, vi_iterations = valueIteration(
-        states, actions, transition_matrix, reward_matrix, gamma, theta, track_history=True
+        states, actions, transition_matrix, reward_matrix, gamma, theta, track_history=True,
+        terminal_states=terminal_states, cache=cache, stats=vi_stats
     )
-    vi_time = time.time() - start_time
+    vi_time = time.perf_counter() - start_time
     
     # Display basic comparison
     print(f"\n📊 RESULTS SUMMARY:")
@@ -126,7 +163,7 @@ def visual_algorithm_comparison(states, actions, transition_matrix, reward_matri
     
     # 1. Value evolution plot
     plot_value_evolution(pi_history, vi_history, states, 
-                        "value_evolution.png" if save_plots else None)
+                        "value_evolution.png" if save_plots else None, terminal_states)
     
     # 2. Convergence comparison
     plot_convergence_comparison(pi_history, vi_history, states,
@@ -139,30 +176,35 @@ def visual_algorithm_comparison(states, actions, transition_matrix, reward_matri
             "policy": pi_policy,
             "history": pi_history,
             "iterations": pi_iterations,
-            "time": pi_time
+            "time": pi_time,
+            "stats": pi_stats
         },
         "value_iteration": {
             "values": vi_values,
             "policy": vi_policy,
             "history": vi_history,
             "iterations": vi_iterations,
-            "time": vi_time
+            "time": vi_time,
+            "stats": vi_stats
         }
     }
 
-def animate_value_evolution(history, states, algorithm_name, save_path=None):
+def animate_value_evolution(history, states, algorithm_name, save_path=None, terminal_states=None):
     """
     Create an animated plot showing value evolution (optional advanced feature).
+    terminal_states (labels or MDP.terminal_mask) are left out, as in plot_value_evolution.
     """
     from matplotlib.animation import FuncAnimation
     
-    non_terminal_states = [s for s in states if s not in ['Destination Reached', 'Acident']]
+    history = _as_value_history(history, states)
+    non_terminal_states = _non_terminal_states(states, terminal_states)
+    non_terminal_values = np.column_stack([history.column(state) for state in non_terminal_states])
     
     fig, ax = plt.subplots(figsize=(10, 6))
     
     def animate(frame):
         ax.clear()
-        values = [history[frame][state] for state in non_terminal_states]
+        values = non_terminal_values[frame]
         bars = ax.bar(range(len(non_terminal_states)), values, color='skyblue', alpha=0.7)
         
         ax.set_title(f'{algorithm_name}: Iteration {frame}', fontsize=14, fontweight='bold')
@@ -173,8 +215,8 @@ def animate_value_evolution(history, states, algorithm_name, save_path=None):
         ax.grid(True, alpha=0.3, axis='y')
         
         # Set consistent y-axis limits
-        max_val = max(max(v_func[state] for state in non_terminal_states) for v_func in history)
-        min_val = min(min(v_func[state] for state in non_terminal_states) for v_func in history)
+        max_val = non_terminal_values.max()
+        min_val = non_terminal_values.min()
         ax.set_ylim(min_val - 10, max_val + 10)
         
         # Add value labels
@@ -0,0 +1,98 @@
+"""
+Warm Starts
+
+    lets valueIteration / policyIteration (and their array versions) continue from an earlier solution instead of
+    from V = 0 and the first action in every state. after a small change to the model the old V is already close
+    to the new fixed point, so far fewer sweeps are needed.
+
+    a previous solution can be given as a {state: value} / {state: action} dictionary, as an array indexed by
+    integer state index, or as the path of a .npz file written by saveSolution or of a model directory written by
+    MDP.save with V and/or policy. solutions saved to disk carry
+    their state and action labels, so they still line up after states are added, removed or reordered
+    (states missing from the file start from 0 / the first action).
+"""
+
+import os
+import numpy as np
+from MDP import MDP
+
+def saveSolution(path, mdp, V=None, policy=None):
+    """
+    Save a value array and/or policy array (indexed like mdp.state_labels) to a .npz file.
+    """
+    arrays = {"state_labels": np.array([str(s) for s in mdp.state_labels])}
+    if V is not None:
+        arrays["V"] = np.asarray(V, dtype=np.float64)
+    if policy is not None:
+        arrays["policy"] = np.array([str(mdp.action_labels[int(a)]) for a in policy])
+    np.savez(path, **arrays)
+
+def loadSolution(path):
+    """
+    Read a file written by saveSolution back as ({state: value} or None, {state: action} or None).
+    Labels come back as strings. path may also be a model directory written by MDP.save.
+    """
+    if os.path.isdir(path):
+        mdp = MDP.load(path)
+        V, policy = MDP.load_solution(path)
+        return (mdp.label_values(V) if V is not None else None,
+                mdp.label_policy(policy) if policy is not None else None)
+
+    with np.load(path) as data:
+        labels = data["state_labels"].tolist()
+        V = dict(zip(labels, data["V"].tolist())) if "V" in data else None
+        policy = dict(zip(labels, data["policy"].tolist())) if "policy" in data else None
+    return V, policy
+
+def _byLabel(mdp, solution):
+    # saved labels are strings, so match on str(label) when the exact label is missing
+    return [solution.get(s, solution.get(str(s))) for s in mdp.state_labels]
+
+def initialValues(mdp, initial_values):
+    """
+    Resolve a warm-start value function (dictionary, array or saveSolution path) to a length-S array, or None.
+    """
+    if initial_values is None:
+        return None
+    if isinstance(initial_values, str):
+        initial_values, _ = loadSolution(initial_values)
+    if isinstance(initial_values, dict):
+        initial_values = [0.0 if value is None else value for value in _byLabel(mdp, initial_values)]
+
+    V = np.array(initial_values, dtype=np.float64)
+    if V.shape != (mdp.num_states,):
+        raise ValueError(f"Initial values must have one entry per state ({mdp.num_states}), got shape {V.shape}")
+    return V
+
+def initialPolicy(mdp, initial_policy):
+    """
+    Resolve a warm-start policy (dictionary of actions, array of action indices or saveSolution path) to a
+    length-S array of action indices, or None.
+    """
+    if initial_policy is None:
+        return None
+    if isinstance(initial_policy, str):
+        _, initial_policy = loadSolution(initial_policy)
+    if isinstance(initial_policy, dict):
+        action_index = dict(mdp.action_index)
+        action_index.update({str(a): j for a, j in mdp.action_index.items() if str(a) not in action_index})
+        initial_policy = [0 if action is None else action_index[action] for action in _byLabel(mdp, initial_policy)]
+
+    policy = np.array(initial_policy, dtype=np.intp)
+    if policy.shape != (mdp.num_states,):
+        raise ValueError(f"Initial policy must have one entry per state ({mdp.num_states}), got shape {policy.shape}")
+    return policy
+
+def iterationsSaved(warm_start, iterations, cold_iterations, budget, cold_solve):
+    """
+    The solvers' report entry "iterations_saved": 0 for a cold solve, else cold_iterations - iterations.
+    cold_iterations=True runs cold_solve() for the count, None leaves it unknown (None); a budgeted solve stops
+    early, so it is never compared against a full cold solve.
+    """
+    if not warm_start:
+        return 0
+    if budget is not None or cold_iterations is None:
+        return None
+    if cold_iterations is True:
+        cold_iterations = cold_solve()
+    return cold_iterations - iterations